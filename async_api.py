@@ -0,0 +1,103 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from main import TourvisorSearchTest, SletatSearchTest, prepare_tourvisor_data, prepare_sletat_data
+from tabs import TabPool
+
+
+SITES = {
+    "tourvisor": (TourvisorSearchTest, prepare_tourvisor_data),
+    "sletat": (SletatSearchTest, prepare_sletat_data),
+}
+
+
+def _failed(reason, duration=0.0):
+    return {"success": False, "duration": duration, "operators": [], "error": reason}
+
+
+class AsyncSearcher:
+    def __init__(self, max_concurrency=4, site_limits=None, pool=None, capture=False, lean=False, timeout=None, tabs=None,
+                 catalog=None):
+        self.max_concurrency = max_concurrency
+        self.site_limits = {site: max_concurrency for site in SITES}
+        self.site_limits.update(site_limits or {})
+        # tabs=N — все поиски во вкладках одного браузера вместо отдельного Chrome на каждый
+        self._own_pool = pool is None and bool(tabs)
+        self.pool = TabPool(max_tabs=tabs, lean=lean) if self._own_pool else pool
+        self.capture = capture
+        self.lean = lean
+        self.timeout = timeout
+        self.catalog = catalog
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="AsyncSearch")
+        self._global = None
+        self._per_site = None
+
+    def _semaphores(self):
+        # Семафоры создаются внутри работающего цикла событий
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+            self._per_site = {site: asyncio.Semaphore(limit) for site, limit in self.site_limits.items()}
+        return self._global, self._per_site
+
+    async def search(self, site, params, timeout=None):
+        if site not in SITES:
+            raise ValueError(f"Неизвестный сайт: {site}")
+        if self.catalog:
+            self.catalog.validate(site, params)
+        timeout = self.timeout if timeout is None else timeout
+        global_sem, per_site = self._semaphores()
+        cls, prepare = SITES[site]
+        async with per_site[site], global_sem:
+            search = cls(self.pool, self.capture, self.lean)
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, search.run_test, prepare(params, self.catalog))
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                # abort закрывает браузер или ждёт вкладку — в цикле событий это остановило бы все поиски.
+                # Общий executor, а не свой: в своём все потоки могут быть заняты зависшими run_test
+                await loop.run_in_executor(None, search.abort)
+                return _failed("timeout", timeout)
+            except asyncio.CancelledError:
+                # Отменённой задаче ждать нечего — закрытие уходит в фон
+                loop.run_in_executor(None, search.abort)
+                raise
+
+    async def compare(self, params, timeout=None):
+        sites = list(SITES)
+        results = await asyncio.gather(*(self.search(site, params, timeout) for site in sites))
+        return dict(zip(sites, results))
+
+    async def as_completed(self, jobs, timeout=None):
+        async def tagged(site, params):
+            return site, params, await self.search(site, params, timeout)
+
+        tasks = [asyncio.ensure_future(tagged(site, params)) for site, params in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Потребитель вышел раньше — отменяем остальные поиски и закрываем их браузеры
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._own_pool:
+            self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+async def search(site, params, timeout=None, **options):
+    async with AsyncSearcher(max_concurrency=1, timeout=timeout, **options) as searcher:
+        return await searcher.search(site, params)
+
+
+async def compare(params, timeout=None, **options):
+    async with AsyncSearcher(max_concurrency=len(SITES), timeout=timeout, **options) as searcher:
+        return await searcher.compare(params)
@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import argparse
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing.util import Finalize
+from driver_pool import DriverPool, available_memory_mb
+from main import run_tourvisor, run_sletat
+from history import HistoryStore
+from completion import policy_for
+from catalog import Catalog, CatalogError
+
+
+SITES = {"tourvisor": run_tourvisor, "sletat": run_sletat}
+BROWSER_MEMORY_MB = 600
+
+_worker_pool = None
+_worker_catalog = None
+_worker_completion = None
+
+
+def default_browser_cap(per_browser_mb=BROWSER_MEMORY_MB):
+    cores = os.cpu_count() or 1
+    available = available_memory_mb()
+    if available is None:
+        return cores
+    return max(1, min(cores, available // per_browser_mb))
+
+
+def load_scenarios(source):
+    if not isinstance(source, (str, os.PathLike)):
+        return list(source)
+    if source == "-":
+        text = sys.stdin.read().strip()
+    else:
+        with open(source, encoding="utf-8") as f:
+            text = f.read().strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _init_worker(reuse_drivers, catalog_path=None, history_path=None):
+    global _worker_pool, _worker_catalog, _worker_completion
+    if catalog_path:
+        _worker_catalog = Catalog(catalog_path)
+    if history_path:
+        # Выученные таймауты ожидания — из той же истории, что пишет основной процесс
+        _worker_completion = policy_for(HistoryStore(history_path, readonly=True))
+    if reuse_drivers:
+        # Тёплый браузер на каждый сайт: карусель чередует сайты, и с одним слотом каждая смена перезапускала бы Chrome.
+        # Занят в процессе всегда один, остальные простаивают до idle_timeout
+        _worker_pool = DriverPool(size=len(SITES))
+        Finalize(None, _worker_pool.close, exitpriority=10)
+
+
+def _run_job(site, scenario):
+    data = {k: v for k, v in scenario.items() if k != "sites"}
+    return SITES[site](data, pool=_worker_pool, catalog=_worker_catalog, completion=_worker_completion)
+
+
+def _failed(error, reason=None):
+    return {"success": False, "duration": 0.0, "operators": [], "error": str(error), "reason": reason}
+
+
+def run_batch(scenarios, site_limits=None, max_browsers=None, reuse_drivers=True, history=None, catalog=None, on_result=None):
+    scenarios = load_scenarios(scenarios)
+    # Лимит — число процессов; при переиспользовании каждый держит по браузеру на сайт, и память считаем на все
+    max_browsers = max_browsers or default_browser_cap(BROWSER_MEMORY_MB * (len(SITES) if reuse_drivers else 1))
+    limits = {site: max_browsers for site in SITES}
+    limits.update(site_limits or {})
+    queues = {site: deque() for site in SITES}
+    results = [{} for _ in scenarios]
+    for index, scenario in enumerate(scenarios):
+        for site in scenario.get("sites", SITES):
+            if site not in SITES:
+                raise ValueError(f"Неизвестный сайт: {site}")
+            if catalog:
+                # Сценарий с ошибкой во входных данных не занимает слот браузера
+                try:
+                    catalog.validate(site, scenario)
+                except CatalogError as e:
+                    results[index][site] = _failed(e, "invalid_input")
+                    if on_result:
+                        on_result(index, site, results[index][site])
+                    continue
+            queues[site].append((index, scenario))
+
+    order = list(SITES)
+    turn = 0
+    running = {}
+    in_flight = Counter()
+    with ProcessPoolExecutor(max_workers=max_browsers, initializer=_init_worker, initargs=(reuse_drivers, catalog.path if catalog else None, history.path if history else None)) as executor:
+        while running or any(queues.values()):
+            progressed = True
+            while progressed and len(running) < max_browsers:
+                progressed = False
+                # Карусель по сайтам: за один проход каждый сайт получает не больше одного слота
+                for shift in range(len(order)):
+                    site = order[(turn + shift) % len(order)]
+                    if queues[site] and in_flight[site] < limits[site] and len(running) < max_browsers:
+                        index, scenario = queues[site].popleft()
+                        running[executor.submit(_run_job, site, scenario)] = (index, site)
+                        in_flight[site] += 1
+                        progressed = True
+                turn = (turn + 1) % len(order)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, site = running.pop(future)
+                in_flight[site] -= 1
+                try:
+                    results[index][site] = future.result()
+                except Exception as e:
+                    results[index][site] = _failed(e, "crashed")
+                if on_result:
+                    # Результат отдаём сразу, не дожидаясь остальных сценариев пакета
+                    on_result(index, site, results[index][site])
+                if history:
+                    # Запись идёт из основного процесса: у SQLite один писатель, воркеры базу не открывают
+                    history.record(site, {k: v for k, v in scenarios[index].items() if k != "sites"}, results[index][site])
+    if history:
+        history.flush()
+    return results
+
+
+def summarize(results):
+    summary = {}
+    for site in SITES:
+        runs = [r[site] for r in results if site in r]
+        ok = [r for r in runs if r["success"]]
+        summary[site] = {
+            "success": len(ok),
+            "duration": sum(r["duration"] for r in ok) / len(ok) if ok else 0.0,
+            "operators": sum(len(r["operators"]) for r in ok),
+            "total": len(runs),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетный запуск сценариев Tourvisor/Sletat")
+    parser.add_argument("scenarios", help="JSON-массив или JSONL со сценариями (- — stdin)")
+    parser.add_argument("--browsers", type=int, default=None, help="Общий лимит параллельных поисков (процессов)")
+    parser.add_argument("--tourvisor", type=int, default=None, help="Лимит параллельных поисков Tourvisor")
+    parser.add_argument("--sletat", type=int, default=None, help="Лимит параллельных поисков Sletat")
+    parser.add_argument("--history", default=None, help="SQLite-файл для истории цен")
+    parser.add_argument("--catalog", default=None, help="JSON справочников сайтов (python catalog.py --refresh)")
+    args = parser.parse_args()
+    limits = {site: getattr(args, site) for site in SITES if getattr(args, site)}
+    store = HistoryStore(args.history) if args.history else None
+    batch_results = run_batch(args.scenarios, limits, args.browsers, history=store, catalog=Catalog(args.catalog) if args.catalog else None)
+    if store:
+        store.close()
+    json.dump({"results": batch_results, "summary": summarize(batch_results)}, sys.stdout, ensure_ascii=False, indent=2)
+    print()
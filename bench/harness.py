@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from driver_pool import DriverPool, create_driver
+from metrics import CallCounter, count_webdriver_calls, percentile
+from replay_server import ReplayServer, load_recording
+from main import TourvisorSearchTest, SletatSearchTest, prepare_tourvisor_data, prepare_sletat_data
+
+
+REPLICAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replicas")
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CLASSES = {"tourvisor": TourvisorSearchTest, "sletat": SletatSearchTest}
+PREPARE = {"tourvisor": prepare_tourvisor_data, "sletat": prepare_sletat_data}
+# Минимальные цены операторов по записанным ответам в recordings/ — что должен собрать перехват
+CAPTURE_EXPECTED = {
+    "tourvisor": {"Anex": 79990, "Coral": 90120, "Pegas Touristik": 88300, "FUN&SUN (TUI)": 86750},
+    "sletat": {"Anex Tour": 80150, "Coral Travel": 86400, "Pegas Touristik": 90990},
+}
+
+
+def bench_data():
+    first = (date.today().replace(day=1) + timedelta(days=32)).replace(day=10)
+    return {
+        "departure_city": "Москва",
+        "destination_country": "Турция",
+        "departure_dates": (first.strftime("%d.%m.%Y"), (first + timedelta(days=2)).strftime("%d.%m.%Y")),
+        "nights": "3-5",
+        "tourists": 3,
+        "charter": 0,
+        "operators": {"anex": 0, "biblioglobus": 0, "funsun": 0, "travelata": 0, "coral": 0, "sunmar": 0, "pegas": 0},
+        "direct": 0,
+    }
+
+
+def replica_routes():
+    routes = {}
+    for site in CLASSES:
+        with open(os.path.join(REPLICAS, f"{site}.html"), encoding="utf-8") as f:
+            routes[f"/{site}.html"] = [f.read()]
+    return routes
+
+
+def capture_recording(site):
+    return load_recording(os.path.join(RECORDINGS, f"{site}.json"))
+
+
+def check_capture(site, search, result):
+    if not (search.network and search.network.enabled):
+        return ["перехват сети не включился"]
+    problems = []
+    if not search.network.finished:
+        problems.append("не распознано завершение поиска")
+    got = {op["name"]: op["amount"] for op in result["operators"]}
+    if got != CAPTURE_EXPECTED[site]:
+        problems.append(f"операторы {got} вместо {CAPTURE_EXPECTED[site]}")
+    return problems
+
+
+def run_site(site, url, pool, counter, runs, data, inject=False, server=None, recording=None):
+    samples = []
+    for _ in range(runs):
+        search = CLASSES[site](pool, capture=bool(recording), inject=inject)
+        search.URL = url
+        # Каждый прогон получает записанные ответы с первого
+        for path, responses in (recording or {}).items():
+            server.add(path, responses)
+        before = counter.total
+        start = time.time()
+        result = search.run_test(PREPARE[site](data))
+        phases = {}
+        for span in result["spans"]:
+            phases[span["name"]] = phases.get(span["name"], 0.0) + span["seconds"]
+        samples.append({
+            "success": result["success"],
+            "operators": len(result["operators"]),
+            "total": time.time() - start,
+            "calls": counter.total - before,
+            "phases": phases,
+            "capture": check_capture(site, search, result) if recording else [],
+        })
+    return summarize_samples(samples)
+
+
+def summarize_samples(samples):
+    def stats(values):
+        return {"p50": round(percentile(values, 50), 3), "p95": round(percentile(values, 95), 3)}
+
+    names = []
+    for sample in samples:
+        names.extend(n for n in sample["phases"] if n not in names)
+    return {
+        "runs": len(samples),
+        "success": sum(s["success"] for s in samples),
+        "operators": stats([s["operators"] for s in samples]),
+        "total": stats([s["total"] for s in samples]),
+        "calls": stats([s["calls"] for s in samples]),
+        "phases": {n: stats([s["phases"].get(n, 0.0) for s in samples]) for n in names},
+        "capture": sorted({p for s in samples for p in s["capture"]}),
+    }
+
+
+def run_benchmark(sites=tuple(CLASSES), runs=5, latency=2000, operators=40, ui=50, data=None, inject=False, capture=False):
+    data = data or bench_data()
+    counters = {site: CallCounter() for site in sites}
+    # capture: реплика опрашивает записанный JSON сайта, а поиск собирает выдачу из перехваченных ответов
+    recordings = {site: capture_recording(site) for site in sites} if capture else {}
+
+    def factory(site):
+        driver = create_driver(site, capture_network=capture)
+        count_webdriver_calls(driver, counters[site])
+        return driver
+
+    report = {"params": {"runs": runs, "latency": latency, "operators": operators, "ui": ui, "inject": inject, "capture": capture}, "sites": {}}
+    with ReplayServer(replica_routes()) as server, DriverPool(size=1, factory=factory, capture=capture) as pool:
+        for site in sites:
+            params = {"latency": latency, "operators": operators, "ui": ui}
+            if capture:
+                params["feed"] = next(iter(recordings[site]))
+            report["sites"][site] = run_site(site, server.url(f"/{site}.html?{urlencode(params)}"), pool, counters[site], runs, data, inject,
+                                             server, recordings.get(site))
+    return report
+
+
+def compare(report, baseline, tolerance=0.2, floor=0.05):
+    regressions = []
+    for site, current in report["sites"].items():
+        base = baseline.get("sites", {}).get(site)
+        if not base:
+            continue
+        rows = [("total", current["total"], base["total"]), ("calls", current["calls"], base["calls"])]
+        rows += [(f"phase:{n}", v, base["phases"][n]) for n, v in current["phases"].items() if n in base["phases"]]
+        for name, now, was in rows:
+            if now["p50"] > was["p50"] * (1 + tolerance) and now["p50"] - was["p50"] > floor:
+                regressions.append({"site": site, "metric": name, "baseline": was["p50"], "current": now["p50"]})
+    return regressions
+
+
+def print_report(report, regressions):
+    for site, data in report["sites"].items():
+        print(f"\n📊 {site}: {data['success']}/{data['runs']} успешно, "
+              f"итого p50 {data['total']['p50']:.2f} с / p95 {data['total']['p95']:.2f} с, "
+              f"вызовов WebDriver p50 {data['calls']['p50']}")
+        for name, s in data["phases"].items():
+            print(f"   {name:<28} p50 {s['p50']:>7.3f}   p95 {s['p95']:>7.3f}")
+        if report["params"].get("capture"):
+            print(f"   перехват: {'; '.join(data['capture'])}" if data["capture"] else "   перехват: операторы и завершение совпали с записью")
+    for r in regressions:
+        print(f"⚠️ Регрессия {r['site']} {r['metric']}: {r['baseline']} → {r['current']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк поиска на локальных репликах виджетов (python -m bench.harness)")
+    parser.add_argument("--sites", nargs="+", default=list(CLASSES), choices=list(CLASSES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=int, default=2000, help="Задержка выдачи результатов, мс")
+    parser.add_argument("--operators", type=int, default=40, help="Число операторов в выдаче")
+    parser.add_argument("--ui", type=int, default=50, help="Задержка реакции интерфейса, мс")
+    parser.add_argument("--inject", action="store_true", help="Заполнять форму одним скриптом formfill (сравните вызовы WebDriver с прогоном без флага)")
+    parser.add_argument("--capture", action="store_true", help="Перехват выдачи из сети: реплики отдают записанный JSON из recordings/, сверяем операторы и завершение")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    bench_report = run_benchmark(args.sites, args.runs, args.latency, args.operators, args.ui, inject=args.inject, capture=args.capture)
+    found = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = compare(bench_report, json.load(f), args.tolerance)
+    print_report(bench_report, found)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(bench_report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Базовая линия сохранена в {args.baseline}")
+    capture_failed = any(data["capture"] for data in bench_report["sites"].values())
+    sys.exit(1 if found or capture_failed else 0)
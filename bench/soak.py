@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import ctypes
+import signal
+import argparse
+import threading
+from urllib.parse import urlencode
+import psutil
+from driver_pool import DriverPool
+from metrics import percentile
+from replay_server import ReplayServer
+from bench.harness import CLASSES, PREPARE, bench_data, replica_routes
+
+
+BROWSER_PROCESSES = ("chromedriver", "chrome", "chromium", "headless_shell")
+PR_SET_CHILD_SUBREAPER = 36
+
+
+def become_subreaper():
+    # Осиротевший Chrome переходит к нам, а не к init: его видно как нашего потомка и можно дождаться
+    try:
+        return ctypes.CDLL(None, use_errno=True).prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def driver_pid(driver):
+    process = getattr(getattr(driver, "service", None), "process", None)
+    return process.pid if process else None
+
+
+def process_tree(pid):
+    if not pid:
+        return []
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def tree_usage(processes):
+    usage = {"rss_mb": 0.0, "fds": 0, "processes": 0}
+    for proc in processes:
+        try:
+            usage["rss_mb"] += proc.memory_info().rss / (1024 * 1024)
+            usage["fds"] += proc.num_fds() if hasattr(proc, "num_fds") else proc.num_handles()
+            usage["processes"] += 1
+        except psutil.Error:
+            continue
+    usage["rss_mb"] = round(usage["rss_mb"], 1)
+    return usage
+
+
+def driver_rss_mb(driver):
+    return tree_usage(process_tree(driver_pid(driver)))["rss_mb"]
+
+
+def _is_browser(name):
+    return (name or "").lower().startswith(BROWSER_PROCESSES)
+
+
+def find_orphans(since, known, seen=(), subreaper=True, grace=120):
+    # Чужие браузеры в том же контейнере не трогаем: под subreaper смотрим только на своих потомков,
+    # иначе — на процессы, которые сами видели в деревьях драйверов, и лишь в крайнем случае на ppid=1
+    me = os.getpid()
+    try:
+        candidates = psutil.Process(me).children(recursive=True) if subreaper else list(psutil.process_iter())
+    except psutil.Error:
+        return []
+    orphans = []
+    for proc in candidates:
+        try:
+            name, ppid, created = proc.name(), proc.ppid(), proc.create_time()
+        except psutil.Error:
+            continue
+        if not _is_browser(name) or proc.pid in known:
+            continue
+        # Браузеры, запущенные до замера, и только что стартующие драйверы пула не трогаем
+        if created < since or created > time.time() - grace:
+            continue
+        if subreaper or (proc.pid, created) in seen or ppid == 1:
+            orphans.append(proc)
+    return orphans
+
+
+def reap(orphans):
+    me = os.getpid()
+    reaped = 0
+    for proc in orphans:
+        try:
+            if proc.status() == psutil.STATUS_ZOMBIE:
+                if proc.ppid() == me:
+                    os.waitpid(proc.pid, os.WNOHANG)
+                    reaped += 1
+                continue
+            tree = proc.children(recursive=True) + [proc]
+            for p in tree:
+                p.kill()
+            _, alive = psutil.wait_procs(tree, timeout=5)
+            reaped += len(tree) - len(alive)
+        except (psutil.Error, ChildProcessError):
+            continue
+    return reaped
+
+
+def slope(points):
+    # Наклон прямой МНК: прирост в час
+    if len(points) < 3:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return round(sum((x - mean_x) * (y - mean_y) for x, y in points) / spread, 3)
+
+
+class SoakRun:
+    def __init__(self, hours=1.0, workers=1, sites=tuple(CLASSES), latency=2000, operators=40, ui=50,
+                 interval=30, max_rss_mb=1500, max_age=1800, max_uses=0, window=600, lean=False, inject=False,
+                 samples_path=None, factory=None):
+        self.hours = hours
+        self.workers = workers
+        self.sites = list(sites)
+        self.query = urlencode({"latency": latency, "operators": operators, "ui": ui})
+        self.interval = interval
+        self.max_rss_mb = max_rss_mb
+        self.window = window
+        self.lean = lean
+        self.inject = inject
+        self.samples_path = samples_path
+        self.pool = DriverPool(
+            size=workers, max_uses=max_uses or float("inf"), idle_timeout=max(300, interval * 4), factory=factory,
+            max_age=max_age, recycle=lambda driver: driver_rss_mb(driver) > max_rss_mb, lean=lean,
+        )
+        self.data = bench_data()
+        self.events = []
+        self.samples = []
+        self.reaped = 0
+        self.seen = set()
+        self.subreaper = False
+        self.started = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self._stop.set()
+
+    def _search(self, server, index):
+        turn = index
+        while not self._stop.is_set() and time.time() < self.deadline:
+            site = self.sites[turn % len(self.sites)]
+            turn += self.workers
+            search = CLASSES[site](self.pool, lean=self.lean, inject=self.inject)
+            search.URL = server.url(f"/{site}.html?{self.query}")
+            start = time.time()
+            try:
+                result = search.run_test(PREPARE[site](self.data))
+                success, reason = result["success"], (result.get("completion") or {}).get("reason")
+            except Exception as e:
+                success, reason = False, type(e).__name__
+            with self._lock:
+                self.events.append({"t": time.time() - self.started, "site": site, "success": success,
+                                    "seconds": round(time.time() - start, 3), "reason": reason})
+
+    def sample(self):
+        trees = {driver_pid(d): process_tree(driver_pid(d)) for d in self.pool.drivers()}
+        known = {p.pid for tree in trees.values() for p in tree}
+        for proc in (p for tree in trees.values() for p in tree):
+            try:
+                self.seen.add((proc.pid, proc.create_time()))
+            except psutil.Error:
+                continue
+        orphans = find_orphans(self.started, known, self.seen, self.subreaper)
+        self.reaped += reap(orphans)
+        browsers = {pid: tree_usage(tree) for pid, tree in trees.items() if pid}
+        me = psutil.Process()
+        record = {
+            "t": round(time.time() - self.started, 1),
+            "browsers": browsers,
+            "rss_mb": round(sum(b["rss_mb"] for b in browsers.values()), 1),
+            "fds": sum(b["fds"] for b in browsers.values()),
+            "processes": sum(b["processes"] for b in browsers.values()),
+            "python_rss_mb": round(me.memory_info().rss / (1024 * 1024), 1),
+            "python_fds": me.num_fds() if hasattr(me, "num_fds") else me.num_handles(),
+            "orphans": len(orphans),
+            "searches": len(self.events),
+            "pool": self.pool.stats(),
+        }
+        self.samples.append(record)
+        if self.samples_path:
+            with open(self.samples_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"🩺 {record['t'] / 60:6.1f} мин: браузеров {len(browsers)}, RSS {record['rss_mb']:.0f} МБ, "
+              f"fd {record['fds']}, процессов {record['processes']}, поисков {record['searches']}, сирот {len(orphans)}")
+        return record
+
+    def run(self):
+        self.started = time.time()
+        self.deadline = self.started + self.hours * 3600
+        self.subreaper = become_subreaper()
+        if not self.subreaper:
+            print("⚠️ Не удалось стать subreaper — сирот ищем среди виденных процессов драйверов и по ppid=1")
+        with ReplayServer(replica_routes()) as server:
+            threads = [threading.Thread(target=self._search, args=(server, i), name=f"Soak-{i}", daemon=True)
+                       for i in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            try:
+                while any(t.is_alive() for t in threads):
+                    self.sample()
+                    self._stop.wait(self.interval)
+            except KeyboardInterrupt:
+                print("\n🛑 Останавливаем прогон — дожидаемся текущих поисков")
+                self.stop()
+                for thread in threads:
+                    thread.join()
+            finally:
+                self.pool.close()
+                # После закрытия пула живых браузеров быть не должно — всё найденное считается утечкой
+                self.reaped += reap(find_orphans(self.started, set(), self.seen, self.subreaper, grace=0))
+        return self.report()
+
+    def report(self):
+        hours = lambda t: t / 3600
+        per_browser = []
+        series = {}
+        for s in self.samples:
+            for pid, usage in s["browsers"].items():
+                series.setdefault(pid, []).append((hours(s["t"]), usage["rss_mb"]))
+        for points in series.values():
+            value = slope(points)
+            if value is not None:
+                per_browser.append(value)
+        windows = []
+        for start in range(0, int((self.events[-1]["t"] if self.events else 0) // self.window) + 1):
+            chunk = [e for e in self.events if start * self.window <= e["t"] < (start + 1) * self.window]
+            if chunk:
+                windows.append({
+                    "from_min": round(start * self.window / 60, 1),
+                    "searches": len(chunk),
+                    "per_hour": round(len(chunk) * 3600 / self.window, 1),
+                    "success": sum(e["success"] for e in chunk),
+                    "p50": round(percentile([e["seconds"] for e in chunk], 50), 2),
+                    "p95": round(percentile([e["seconds"] for e in chunk], 95), 2),
+                })
+        elapsed = (time.time() - self.started) if self.started else 0.0
+        return {
+            "hours": round(hours(elapsed), 3),
+            "searches": len(self.events),
+            "success": sum(e["success"] for e in self.events),
+            "per_hour": round(len(self.events) / hours(elapsed), 1) if elapsed else 0.0,
+            "slopes_per_hour": {
+                "browsers_rss_mb": slope([(hours(s["t"]), s["rss_mb"]) for s in self.samples]),
+                "browser_rss_mb_median": percentile(per_browser, 50) if per_browser else None,
+                "fds": slope([(hours(s["t"]), s["fds"]) for s in self.samples]),
+                "processes": slope([(hours(s["t"]), s["processes"]) for s in self.samples]),
+                "python_rss_mb": slope([(hours(s["t"]), s["python_rss_mb"]) for s in self.samples]),
+                "python_fds": slope([(hours(s["t"]), s["python_fds"]) for s in self.samples]),
+            },
+            "recycled": self.pool.stats()["recycled"],
+            "reaped": self.reaped,
+            "throughput": windows,
+        }
+
+
+def print_report(report):
+    print(f"\n📊 Прогон {report['hours']:.2f} ч: {report['success']}/{report['searches']} успешно, "
+          f"{report['per_hour']} поисков в час")
+    for name, value in report["slopes_per_hour"].items():
+        print(f"   {name:<24} {'—' if value is None else f'{value:+.2f} / ч'}")
+    print(f"♻️ Перезапущено браузеров: {report['recycled'] or 0}; убрано осиротевших процессов: {report['reaped']}")
+    for w in report["throughput"]:
+        print(f"   с {w['from_min']:>6.1f} мин: {w['searches']:>4} поисков ({w['per_hour']}/ч), "
+              f"успешно {w['success']}, p50 {w['p50']} с, p95 {w['p95']} с")
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Многочасовой прогон на репликах с учётом памяти и процессов браузеров (python -m bench.soak)")
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sites", nargs="+", default=list(CLASSES), choices=list(CLASSES))
+    parser.add_argument("--latency", type=int, default=2000)
+    parser.add_argument("--operators", type=int, default=40)
+    parser.add_argument("--ui", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=30, help="Период замеров, сек")
+    parser.add_argument("--max-rss", type=float, default=1500, help="Перезапуск браузера, если его дерево процессов больше, МБ")
+    parser.add_argument("--max-age", type=float, default=1800, help="Перезапуск браузера старше, сек")
+    parser.add_argument("--max-uses", type=int, default=0, help="Перезапуск после N поисков (0 — без лимита)")
+    parser.add_argument("--window", type=float, default=600, help="Окно для пропускной способности, сек")
+    parser.add_argument("--lean", action="store_true")
+    parser.add_argument("--inject", action="store_true")
+    parser.add_argument("--samples", default=None, help="JSONL с замерами по ходу прогона")
+    parser.add_argument("--report", default=None, help="Сохранить итоговый отчёт в JSON")
+    args = parser.parse_args()
+
+    # kill без -9 тоже должен закрыть браузеры
+    signal.signal(signal.SIGTERM, _interrupt)
+    soak_report = SoakRun(
+        args.hours, args.workers, args.sites, args.latency, args.operators, args.ui, args.interval,
+        args.max_rss, args.max_age, args.max_uses, args.window, args.lean, args.inject, args.samples,
+    ).run()
+    print_report(soak_report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(soak_report, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if soak_report["searches"] else 1)
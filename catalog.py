@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+import json
+import time
+import difflib
+import argparse
+import threading
+from datetime import datetime
+from selenium.webdriver.support.ui import WebDriverWait
+from comparison import OperatorNormalizer
+from pipeline import DISMISS_JS
+from result_cache import normalize_city
+
+
+CATALOG_TTL = 7 * 24 * 3600
+TABLES = ("cities", "countries", "operators")
+# DOM id не годится: ui-select генерирует его при каждом рендере, и он может достаться другой опции
+ID_ATTRS = ("data-id", "data-value", "data-key", "value")
+
+# Откуда собирать справочники: поле, открывающее список, элементы списка и подпись внутри элемента
+HARVEST = {
+    "tourvisor": {
+        "cities": {"open": "div.TVDepartureFilter", "item": ".TVDepartureTableBody div"},
+        "countries": {"open": "div.TVCountryFilter", "item": ".TVCountryAirportList .TVComplexListItem"},
+        "operators": {"open": "div.TVOperatorListFilter", "item": ".TVOperatorsList .TVCheckBox"},
+    },
+    "sletat": {
+        # Список городов Sletat строится по вводу — пустая строка показывает все
+        "cities": {"open": "input.excludeClickOutside", "type": "", "item": "div.city-selector-list ul li button"},
+        "countries": {"open": "#ui-select-country-to", "item": "div.uis-select__options_country-to li.uis-select__options-item",
+                      "name": "span.slsf-country-to__select-text"},
+        "operators": {"open": ".uis-text_tour-operator", "item": "label.tour-operator", "name": "span.slsf-text-bold"},
+    },
+}
+
+OPEN_LIST_JS = """
+const el = document.querySelector(arguments[0]);
+if (!el) return false;
+el.click();
+if (arguments[1] !== null) {
+    Object.getOwnPropertyDescriptor(Object.getPrototypeOf(el), 'value').set.call(el, arguments[1]);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+}
+return true;
+"""
+
+# Один вызов на справочник: подписи и внутренний ID из первого атрибута-идентификатора элемента или его потомков
+HARVEST_JS = """
+const itemSel = arguments[0], nameSel = arguments[1], ATTRS = arguments[2];
+const clean = s => (s || '').replace(/\\s+/g, ' ').trim();
+const own = el => clean(Array.from(el.childNodes).filter(n => n.nodeType === 3).map(n => n.textContent).join(''));
+const seen = new Set();
+const entries = [];
+for (const el of document.querySelectorAll(itemSel)) {
+    const name = nameSel ? clean((el.querySelector(nameSel) || {}).textContent) : own(el);
+    if (!name || seen.has(name)) continue;
+    seen.add(name);
+    let attr = null, id = null;
+    for (const node of [el, ...el.querySelectorAll('*')]) {
+        attr = ATTRS.find(a => node.hasAttribute(a) && node.getAttribute(a) !== '') || null;
+        if (attr) {
+            id = node.getAttribute(attr);
+            break;
+        }
+    }
+    entries.push({name, id, attr});
+}
+return entries;
+"""
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def option_selector(item, ref):
+    # Опция по ID одним CSS-селектором: атрибут может висеть на самом элементе или на вложенном
+    # Справочники, собранные до отказа от DOM id, тоже не используем
+    if not ref or ref.get("attr") not in ID_ATTRS:
+        return None
+    value = str(ref["id"]).replace("\\", "\\\\").replace('"', '\\"')
+    return f'{item}[{ref["attr"]}="{value}"], {item} [{ref["attr"]}="{value}"]'
+
+
+def _check_params(test_data):
+    errors = []
+    dates = []
+    for value in test_data.get("departure_dates") or []:
+        try:
+            dates.append(datetime.strptime(str(value).strip(), "%d.%m.%Y"))
+        except ValueError:
+            errors.append(f"дата '{value}' не в формате ДД.ММ.ГГГГ")
+    if len(dates) == 2 and dates[0] > dates[1]:
+        errors.append("дата вылета позже конца диапазона")
+    match = re.fullmatch(r"\s*(\d+)\s*-\s*(\d+)\s*", str(test_data.get("nights", "")))
+    if not match:
+        errors.append(f"ночи '{test_data.get('nights')}' не в формате «от-до»")
+    elif int(match.group(1)) > int(match.group(2)):
+        errors.append(f"ночи '{test_data['nights']}': минимум больше максимума")
+    return errors
+
+
+class Catalog:
+    def __init__(self, path="catalog.json", ttl=CATALOG_TTL, normalizer=None):
+        self.path = path
+        self.ttl = ttl
+        self.normalizer = normalizer or OperatorNormalizer()
+        self._lock = threading.Lock()
+        self._warned = set()
+        self.data = {}
+        self._index = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        for site in self.data:
+            self._reindex(site)
+
+    def _key(self, table, value):
+        if table == "cities":
+            return normalize_city(value)
+        if table == "operators":
+            return self.normalizer.canonical(value)
+        return re.sub(r"\s+", " ", str(value)).strip().lower().replace("ё", "е")
+
+    def _reindex(self, site):
+        self._index[site] = {
+            table: {self._key(table, e["name"]): e for e in self.data[site].get(table, [])} for table in TABLES
+        }
+
+    def update(self, site, tables, harvested_at=None):
+        with self._lock:
+            self.data[site] = {"harvested_at": harvested_at or time.time(), **tables}
+            self._reindex(site)
+            # Через временный файл: параллельный процесс не прочитает недописанный JSON
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+
+    def has(self, site):
+        return site in self.data
+
+    def age(self, site):
+        if site not in self.data:
+            return None
+        return time.time() - self.data[site]["harvested_at"]
+
+    def stale(self, site):
+        age = self.age(site)
+        return age is None or age > self.ttl
+
+    def find(self, site, table, value):
+        return self._index.get(site, {}).get(table, {}).get(self._key(table, value))
+
+    def suggest(self, site, table, value, n=3):
+        index = self._index.get(site, {}).get(table, {})
+        close = difflib.get_close_matches(self._key(table, value), list(index), n=n, cutoff=0.6)
+        return [index[key]["name"] for key in close]
+
+    def resolve(self, site, test_data):
+        refs = {"operators": {}}
+        for field, table in (("departure_city", "cities"), ("destination_country", "countries")):
+            entry = self.find(site, table, test_data[field])
+            if entry:
+                refs[field] = dict(entry)
+        for key, flag in (test_data.get("operators") or {}).items():
+            entry = self.find(site, "operators", key) if flag else None
+            if entry:
+                refs["operators"][key] = dict(entry)
+        return refs
+
+    def validate(self, site, test_data):
+        errors = _check_params(test_data)
+        if self.has(site):
+            if self.stale(site) and site not in self._warned:
+                self._warned.add(site)
+                print(f"⚠️ Справочник {site} устарел ({self.age(site) / 86400:.0f} дн.) — обновите: python catalog.py --refresh {site}")
+            for field, table in (("departure_city", "cities"), ("destination_country", "countries")):
+                value = test_data[field]
+                if self.find(site, table, value) is None:
+                    hint = self.suggest(site, table, value)
+                    errors.append(f"'{value}' нет на {site}" + (f" (возможно: {', '.join(hint)})" if hint else ""))
+            # Список операторов на сайте зависит от направления — неизвестный оператор не повод отменять поиск
+            for key, flag in (test_data.get("operators") or {}).items():
+                if flag and self.find(site, "operators", key) is None:
+                    print(f"⚠️ Оператора {key} нет в справочнике {site}")
+        if errors:
+            raise CatalogError("; ".join(errors))
+
+
+def harvest(driver, site, timeout=10):
+    tables = {}
+    for table, spec in HARVEST[site].items():
+        driver.execute_script(DISMISS_JS)
+        if not driver.execute_script(OPEN_LIST_JS, spec["open"], spec.get("type")):
+            raise CatalogError(f"Нет поля {spec['open']} на {site}")
+        counts = []
+
+        def settled(d):
+            # Список догружается частями — ждём, пока число элементов перестанет расти
+            counts.append(d.execute_script("return document.querySelectorAll(arguments[0]).length;", spec["item"]))
+            return counts[-1] > 0 and len(counts) > 1 and counts[-1] == counts[-2]
+        WebDriverWait(driver, timeout, poll_frequency=0.3).until(settled)
+        tables[table] = driver.execute_script(HARVEST_JS, spec["item"], spec.get("name"), list(ID_ATTRS))
+        print(f"📚 {site}: {table} — {len(tables[table])}")
+    driver.execute_script(DISMISS_JS)
+    return tables
+
+
+def refresh(catalog, site, lean=False, url=None):
+    # main импортирует каталог, поэтому классы поиска берём при вызове
+    from main import TourvisorSearchTest, SletatSearchTest
+    search = {"tourvisor": TourvisorSearchTest, "sletat": SletatSearchTest}[site](lean=lean)
+    if url:
+        search.URL = url
+    try:
+        search.setup()
+        getattr(search, f"open_{site}")()
+        tables = harvest(search.driver, site)
+    finally:
+        search.teardown()
+    catalog.update(site, tables)
+    return tables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Справочники городов, стран и операторов сайтов")
+    parser.add_argument("--path", default="catalog.json")
+    parser.add_argument("--ttl", type=float, default=CATALOG_TTL / 86400, help="Срок годности справочника, дней")
+    parser.add_argument("--refresh", nargs="*", choices=list(HARVEST), help="Собрать справочники заново (без списка — устаревшие)")
+    parser.add_argument("--force", action="store_true", help="Обновить, даже если справочник свежий")
+    parser.add_argument("--lean", action="store_true")
+    parser.add_argument("--check", help="JSON/JSONL со сценариями — проверить без запуска браузера")
+    args = parser.parse_args()
+
+    store = Catalog(args.path, ttl=args.ttl * 86400)
+    if args.refresh is not None:
+        for name in args.refresh or list(HARVEST):
+            if args.force or store.stale(name):
+                refresh(store, name, lean=args.lean)
+    if args.check:
+        from batch import load_scenarios
+        invalid = 0
+        for number, scenario in enumerate(load_scenarios(args.check), 1):
+            for name in scenario.get("sites", HARVEST):
+                try:
+                    store.validate(name, scenario)
+                except CatalogError as e:
+                    invalid += 1
+                    print(f"❌ Сценарий {number}, {name}: {e}")
+        print(f"{'✅' if not invalid else '⚠️'} Ошибок: {invalid}")
+        sys.exit(1 if invalid else 0)
+    for name in HARVEST:
+        age = store.age(name)
+        state = "нет данных" if age is None else f"{age / 3600:.1f} ч назад" + (" (устарел)" if store.stale(name) else "")
+        sizes = ", ".join(f"{t}: {len(store.data.get(name, {}).get(t, []))}" for t in TABLES)
+        print(f"📚 {name}: {state}; {sizes}")
@@ -0,0 +1,206 @@
+import re
+import sys
+import json
+import argparse
+import warnings
+import numpy as np
+from extract import parse_amount
+
+
+SITES = ("tourvisor", "sletat")
+
+# Каноническое имя → варианты написания на сайтах. Ключи совпадают с ключами test_data["operators"]
+OPERATOR_ALIASES = {
+    "anex": ["anex", "anex tour", "anex tours", "анекс"],
+    "biblioglobus": ["biblioglobus", "biblio globus", "библио глобус", "библио-глобус"],
+    "funsun": ["fun&sun", "fun&sun (tui)", "fun & sun", "fun and sun", "fun&sun tui", "tui", "фан энд сан"],
+    "travelata": ["travelata", "травелата"],
+    "coral": ["coral", "coral travel", "корал", "корал тревел"],
+    "sunmar": ["sunmar", "санмар"],
+    "pegas": ["pegas", "pegas touristik", "pegast", "пегас", "пегас туристик"],
+    "tez": ["tez tour", "tez", "тез тур"],
+    "intourist": ["intourist", "интурист"],
+    "pac": ["pac group", "pac", "пак групп"],
+    "ican": ["ican", "ай кэн"],
+    "russian express": ["russian express", "русский экспресс"],
+}
+
+RATES = {"RUB": 1.0}
+
+
+def _clean(name):
+    name = str(name).lower().replace("ё", "е")
+    name = re.sub(r"[«»\"'.,]", "", name)
+    name = re.sub(r"\s*&\s*", "&", name)
+    return re.sub(r"\s+", " ", name).strip()
+
+
+class OperatorNormalizer:
+    def __init__(self, aliases=None):
+        self.aliases = {}
+        self.update(OPERATOR_ALIASES if aliases is None else aliases)
+
+    def update(self, aliases):
+        for canonical, names in aliases.items():
+            for name in [canonical, *names]:
+                self.aliases[_clean(name)] = canonical
+
+    def canonical(self, name):
+        key = _clean(name)
+        if key in self.aliases:
+            return self.aliases[key]
+        # «FUN&SUN (TUI) Россия» и подобные подписи — ищем по имени без скобок
+        bare = re.sub(r"\s*\(.*?\)", "", key).strip()
+        return self.aliases.get(bare, key)
+
+
+def load_aliases(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_results(source):
+    if isinstance(source, str):
+        with open(source, encoding="utf-8") as f:
+            text = f.read().strip()
+        if text.startswith("[") or text.startswith("{"):
+            source = json.loads(text)
+        else:
+            source = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(source, dict):
+        source = source.get("results", [source])
+    return list(source)
+
+
+class CrossSiteComparison:
+    def __init__(self, results, normalizer=None, rates=None, sites=SITES):
+        self.sites = list(sites)
+        self.normalizer = normalizer or OperatorNormalizer()
+        rates = dict(RATES, **(rates or {}))
+        names, rows, cols, slots, amounts = {}, [], [], [], []
+        for row, scenario in enumerate(results):
+            for col, site in enumerate(self.sites):
+                result = scenario.get(site) or {}
+                for op in result.get("operators", []):
+                    amount = op.get("amount")
+                    if amount is None:
+                        amount = parse_amount(op.get("price"))
+                    rate = rates.get(op.get("currency") or "RUB")
+                    if amount is None or rate is None:
+                        continue
+                    canonical = self.normalizer.canonical(op["name"])
+                    rows.append(row)
+                    slots.append(names.setdefault(canonical, len(names)))
+                    cols.append(col)
+                    amounts.append(amount * rate)
+        self.operators = list(names)
+        # prices[сценарий, оператор, сайт]; NaN — у сайта нет предложения этого оператора
+        self.prices = np.full((len(results), len(self.operators), len(self.sites)), np.nan)
+        if amounts:
+            np.fmin.at(self.prices, (np.array(rows), np.array(slots), np.array(cols)), np.array(amounts, dtype=float))
+
+    @property
+    def present(self):
+        return ~np.isnan(self.prices)
+
+    @property
+    def overlap(self):
+        return self.present.all(axis=2)
+
+    def deltas(self, base=0, other=1):
+        # Положительная разница — первый сайт дороже второго
+        return self.prices[:, :, base] - self.prices[:, :, other]
+
+    def relative_deltas(self, base=0, other=1):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.deltas(base, other) / np.fmin(self.prices[:, :, base], self.prices[:, :, other])
+
+    def cheapest_site(self):
+        filled = np.where(self.present, self.prices, np.inf)
+        best = filled.argmin(axis=2)
+        low = filled.min(axis=2)
+        ties = (filled == low[:, :, None]).sum(axis=2) > 1
+        # -1 — предложений нет, -2 — цены совпали
+        return np.where(np.isinf(low), -1, np.where(ties, -2, best))
+
+    def operator_stats(self):
+        delta = self.deltas()
+        relative = self.relative_deltas()
+        overlap = self.overlap
+        counts = overlap.sum(axis=0)
+        cheapest = self.cheapest_site()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            stats = {
+                "overlap": counts,
+                "mean_delta": np.nanmean(delta, axis=0),
+                "median_delta": np.nanmedian(delta, axis=0),
+                "p95_abs_delta": np.nanpercentile(np.abs(delta), 95, axis=0),
+                "mean_relative": np.nanmean(relative, axis=0),
+                "max_abs_delta": np.nanmax(np.abs(delta), axis=0),
+            }
+        for index, site in enumerate(self.sites):
+            stats[f"{site}_cheaper"] = ((cheapest == index) & overlap).sum(axis=0)
+        stats["ties"] = ((cheapest == -2) & overlap).sum(axis=0)
+        return stats
+
+    def scenario_summary(self):
+        filled = np.where(self.present, self.prices, np.inf)
+        best_per_site = filled.min(axis=1)
+        best_site = best_per_site.argmin(axis=1)
+        best_price = best_per_site.min(axis=1)
+        return {
+            "best_per_site": np.where(np.isinf(best_per_site), np.nan, best_per_site),
+            "best_site": np.where(np.isinf(best_price), -1, best_site),
+            "best_price": np.where(np.isinf(best_price), np.nan, best_price),
+            "operators_per_site": self.present.sum(axis=1),
+        }
+
+    def report(self):
+        def clean(values):
+            return [None if np.isnan(v) else round(float(v), 4) for v in np.asarray(values, dtype=float)]
+
+        stats = {key: clean(values) for key, values in self.operator_stats().items()}
+        summary = self.scenario_summary()
+        wins = np.bincount(summary["best_site"][summary["best_site"] >= 0], minlength=len(self.sites))
+        return {
+            "scenarios": int(self.prices.shape[0]),
+            "sites": self.sites,
+            "operators": {
+                name: {key: values[i] for key, values in stats.items()}
+                for i, name in enumerate(self.operators)
+            },
+            "best_site_wins": dict(zip(self.sites, wins.tolist())),
+        }
+
+
+def print_report(report):
+    base, other = report["sites"][:2]
+    print(f"\n📊 Сравнение по {report['scenarios']} сценариям: {base} − {other}")
+    print(f"{'Оператор':<20}{'пересеч.':>9}{'ср. разница':>14}{'медиана':>12}{'%':>8}{base:>11}{other:>9}")
+    rows = sorted(report["operators"].items(), key=lambda item: -(item[1]["overlap"] or 0))
+    for name, s in rows:
+        if not s["overlap"]:
+            continue
+        print(f"{name:<20}{int(s['overlap']):>9}{s['mean_delta']:>14.0f}{s['median_delta']:>12.0f}"
+              f"{s['mean_relative'] * 100:>7.1f}%{int(s[f'{base}_cheaper']):>11}{int(s[f'{other}_cheaper']):>9}")
+    wins = ", ".join(f"{site}: {count}" for site, count in report["best_site_wins"].items())
+    print(f"\n🏆 Самый дешёвый тур по сценарию — {wins}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение цен операторов между сайтами по выдаче batch.py")
+    parser.add_argument("results", help="JSON вывода batch.py или JSONL со словарями {сайт: результат}")
+    parser.add_argument("--aliases", help="JSON {каноническое имя: [варианты]} в дополнение к встроенной таблице")
+    parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON")
+    args = parser.parse_args()
+
+    normalizer = OperatorNormalizer()
+    if args.aliases:
+        normalizer.update(load_aliases(args.aliases))
+    comparison_report = CrossSiteComparison(load_results(args.results), normalizer).report()
+    if args.json:
+        json.dump(comparison_report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(comparison_report)
@@ -0,0 +1,134 @@
+import time
+import weakref
+import threading
+from selenium.common.exceptions import WebDriverException
+from metrics import percentile
+
+
+DEFAULT_TIMEOUTS = {"tourvisor": 120, "sletat": 90}
+STABLE_FOR = {"tourvisor": 6.0, "sletat": 4.0}
+
+# Один вызов за опрос: индикатор прогресса сайта плюс отпечаток текущей выдачи
+TOURVISOR_PROBE_JS = """
+const shown = el => el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+const bars = Array.from(document.querySelectorAll('.TVProgressBar'))
+    .filter(b => !(b.parentElement && b.parentElement.querySelector('[class*="TVResultToolbar"]')));
+const running = bars.some(shown) || document.querySelectorAll('div[class*="TVResultToolbarProgress"][style]').length > 0;
+const items = document.querySelectorAll('.TVResultItem');
+const body = document.querySelector('.TVOperatorFilterColumnBody');
+// Пока полоса ещё не появлялась, «нет полосы» не значит «готово» — это решает wait_for_completion
+return {
+    state: running ? 'running' : (items.length ? 'done' : 'idle'),
+    items: items.length,
+    signature: items.length + '|' + (body ? body.textContent : '') + '|' +
+        Array.from(items).slice(0, 30).map(i => i.textContent).join('|'),
+};
+"""
+
+SLETAT_PROBE_JS = """
+if (document.querySelector('.tour-not-found-message')) return {state: 'empty', items: 0, signature: ''};
+const rows = document.querySelectorAll('.blinchik__operator-container li.blinchik__operator-item');
+// Ни итога, ни «не найдено» — поиск ещё идёт
+return {
+    state: document.querySelector('div.search-status__tours-count') ? 'done' : 'running',
+    items: rows.length,
+    signature: Array.from(rows).map(r => r.textContent.replace(/\\s+/g, ' ')).join('|'),
+};
+"""
+
+PROBES = {"tourvisor": TOURVISOR_PROBE_JS, "sletat": SLETAT_PROBE_JS}
+
+
+class CompletionPolicy:
+    def __init__(self, history=None, stable_for=None, poll=0.5, quantile=95, margin=1.5,
+                 min_timeout=15, max_timeout=180, min_samples=10, refresh=300):
+        self.history = history
+        self.stable_for = dict(STABLE_FOR, **(stable_for or {}))
+        self.poll = poll
+        self.quantile = quantile
+        self.margin = margin
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.refresh = refresh
+        self._learned = {}
+
+    def stable_window(self, site):
+        return self.stable_for.get(site, 5.0)
+
+    def timeout_for(self, site, test_data=None):
+        if self.history is None:
+            return DEFAULT_TIMEOUTS.get(site, 120)
+        route = (test_data["departure_city"], test_data["destination_country"]) if test_data else (None, None)
+        key = (site, route)
+        cached = self._learned.get(key)
+        if cached and time.time() - cached[1] < self.refresh:
+            return cached[0]
+        timeout = self._learn(site, *route)
+        self._learned[key] = (timeout, time.time())
+        return timeout
+
+    def _learn(self, site, city=None, country=None):
+        # Сначала распределение по маршруту, при нехватке данных — по сайту целиком
+        routes = [(city, country), (None, None)] if city else [(None, None)]
+        for route in routes:
+            rows = self.history.step_timings(site, "wait", *route)
+            # Ожидания, упёршиеся в таймаут, показывают потолок, а не время завершения
+            seconds = [r["seconds"] for r in rows if r["ok"] and r["reason"] not in ("timeout", "stale")]
+            if len(seconds) >= self.min_samples:
+                learned = percentile(seconds, self.quantile) * self.margin
+                return round(min(self.max_timeout, max(self.min_timeout, learned)), 1)
+        return DEFAULT_TIMEOUTS.get(site, 120)
+
+
+_policies = weakref.WeakKeyDictionary()
+_policies_lock = threading.Lock()
+
+
+def policy_for(history):
+    # Одна политика на хранилище: иначе её кэш выученных таймаутов живёт ровно один поиск
+    with _policies_lock:
+        policy = _policies.get(history)
+        if policy is None:
+            policy = _policies[history] = CompletionPolicy(history)
+        return policy
+
+
+def probe_page(driver, site):
+    try:
+        return driver.execute_script(PROBES[site]) or {}
+    except WebDriverException:
+        return {}
+
+
+def wait_for_completion(driver, site, timeout, stable_for, poll=0.5, on_poll=None, stale=None):
+    start = time.time()
+    signature, changed_at, items = None, start, 0
+    # Поиск мог ещё не начаться: «idle» завершает ожидание только после того, как сайт показал «running»
+    started = False
+    # stale — отпечаток выдачи до нажатия «Найти». При повторном поиске на той же странице
+    # старая выдача ещё в DOM: ей верим только после «running» или смены отпечатка
+    fresh = stale is None
+    while True:
+        probe = probe_page(driver, site)
+        if on_poll:
+            on_poll()
+        now = time.time()
+        items = probe.get("items", items)
+        reason = None
+        started = started or probe.get("state") == "running"
+        fresh = fresh or started or ("signature" in probe and probe["signature"] != stale)
+        if fresh and (probe.get("state") == "done" or (probe.get("state") == "idle" and started)):
+            reason = "progress"
+        elif fresh and probe.get("state") == "empty":
+            reason = "empty"
+        elif probe.get("signature") != signature:
+            signature, changed_at = probe.get("signature"), now
+        elif fresh and items and now - changed_at >= stable_for:
+            reason = "stable"
+        if reason is None and now - start >= timeout:
+            # Сайт так и не сменил прежнюю выдачу — её нельзя выдавать за результат нового поиска
+            reason = "timeout" if fresh else "stale"
+        if reason:
+            return {"reason": reason, "seconds": round(now - start, 3), "timeout": timeout, "items": items}
+        time.sleep(poll)
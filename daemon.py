@@ -0,0 +1,367 @@
+import json
+import time
+import uuid
+import heapq
+import argparse
+import itertools
+import threading
+from collections import deque, Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from driver_pool import DriverPool, check_pool_profile
+from batch import SITES, default_browser_cap
+from result_cache import ResultCache, cache_key
+from history import HistoryStore
+from catalog import Catalog
+from metrics import METRICS, percentile
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, site, params, priority, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.site = site
+        self.params = params
+        self.priority = priority
+        self.key = key
+        self.state = "queued"
+        self.waiters = 1
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def view(self):
+        data = {
+            "id": self.id, "site": self.site, "state": self.state, "priority": self.priority, "waiters": self.waiters,
+            "submitted_at": self.submitted_at,
+            "queued": round((self.started_at or time.time()) - self.submitted_at, 3),
+        }
+        if self.started_at:
+            data["running"] = round((self.finished_at or time.time()) - self.started_at, 3)
+        if self.done.is_set():
+            data["result"] = self.result
+            data["error"] = self.error
+        return data
+
+
+class SearchDaemon:
+    def __init__(self, slots=None, max_queue=100, pool=None, cache=None, history=None, catalog=None,
+                 lean=False, inject=False, keep=600, window=1000):
+        # Слоты — число одновременных поисков, то есть браузеров; остальное ждёт в очереди
+        self.slots = slots or default_browser_cap()
+        self.max_queue = max_queue
+        self._own_pool = pool is None
+        self.pool = DriverPool(size=self.slots, lean=lean) if self._own_pool else pool
+        # Чужой пул с другим профилем провалил бы каждую задачу в setup — отказываем сразу
+        check_pool_profile(self.pool, lean, False)
+        self.cache = cache
+        self.history = history
+        self.catalog = catalog
+        self.lean = lean
+        self.inject = inject
+        self.keep = keep
+        self.started_at = time.time()
+        self.counts = Counter()
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._inflight = {}
+        self._latency = {name: deque(maxlen=window) for name in ("queue", "run", "total")}
+        self._lock = threading.Condition()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name=f"SearchWorker-{i}", daemon=True) for i in range(self.slots)]
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def validate(self, site, params):
+        if site not in SITES:
+            raise ValueError(f"Неизвестный сайт: {site}")
+        if self.catalog:
+            self.catalog.validate(site, params)
+
+    def submit(self, site, params, priority=0):
+        self.validate(site, params)
+        key = cache_key(site, params)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Демон остановлен")
+            job = self._inflight.get(key)
+            if job:
+                # Такой же поиск уже в очереди или в браузере — ждём его результат вместо второго браузера
+                job.waiters += 1
+                self.counts["coalesced"] += 1
+                if priority > job.priority and job.state == "queued":
+                    job.priority = priority
+                    heapq.heappush(self._heap, (-priority, next(self._seq), job))
+                return job, True
+            if self._queued_locked() >= self.max_queue:
+                self.counts["rejected"] += 1
+                raise QueueFull(f"Очередь заполнена ({self.max_queue})")
+            job = Job(site, params, priority, key)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            heapq.heappush(self._heap, (-priority, next(self._seq), job))
+            self.counts["submitted"] += 1
+            self._lock.notify()
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job, timeout=None):
+        return job.done.wait(timeout)
+
+    def _queued_locked(self):
+        return sum(1 for job in self._inflight.values() if job.state == "queued")
+
+    def _next_locked(self):
+        while self._heap:
+            _, _, job = heapq.heappop(self._heap)
+            # После повышения приоритета в куче остаётся старая запись той же задачи
+            if job.state == "queued":
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                job = self._next_locked()
+                while job is None and not self._closed:
+                    self._lock.wait()
+                    job = self._next_locked()
+                if job is None:
+                    return
+                job.state = "running"
+                job.started_at = time.time()
+            try:
+                result = SITES[job.site](
+                    job.params, pool=self.pool, cache=self.cache, lean=self.lean, history=self.history,
+                    inject=self.inject, catalog=self.catalog,
+                )
+                state, error = "done", None
+            except Exception as e:
+                print(f"💥 Задача {job.id} ({job.site}): {e}")
+                result, state, error = {"success": False, "duration": 0.0, "operators": [], "error": str(e)}, "failed", str(e)
+            self._finish(job, state, result, error)
+
+    def _finish(self, job, state, result, error):
+        with self._lock:
+            job.result, job.state, job.error = result, state, error
+            job.finished_at = time.time()
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            if job.started_at:
+                self._latency["queue"].append(job.started_at - job.submitted_at)
+                self._latency["run"].append(job.finished_at - job.started_at)
+                self._latency["total"].append(job.finished_at - job.submitted_at)
+            self.counts[state] += 1
+            self._expire_locked()
+        job.done.set()
+
+    def _expire_locked(self):
+        limit = time.time() - self.keep
+        for job_id in [i for i, j in self._jobs.items() if j.finished_at and j.finished_at < limit]:
+            del self._jobs[job_id]
+
+    def status(self):
+        with self._lock:
+            active = list(self._inflight.values())
+            latency = {
+                name: {
+                    "p50": round(percentile(values, 50), 3), "p95": round(percentile(values, 95), 3),
+                    "p99": round(percentile(values, 99), 3), "count": len(values),
+                }
+                for name, values in self._latency.items()
+            }
+            counts = dict(self.counts)
+        queued = [job for job in active if job.state == "queued"]
+        return {
+            "uptime": round(time.time() - self.started_at, 1),
+            "slots": self.slots,
+            "lean": self.pool.lean,
+            "running": len(active) - len(queued),
+            "queue": len(queued),
+            "queue_by_site": dict(Counter(job.site for job in queued)),
+            "max_queue": self.max_queue,
+            "waiters": sum(job.waiters for job in active),
+            "counts": counts,
+            "latency": latency,
+            "pool": self.pool.stats(),
+        }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            queued = [job for job in self._inflight.values() if job.state == "queued"]
+            self._heap = []
+            self._lock.notify_all()
+        for job in queued:
+            self._finish(job, "failed", {"success": False, "duration": 0.0, "operators": [], "error": "shutdown"}, "shutdown")
+        if self._own_pool:
+            self.pool.close()
+        if self.history:
+            self.history.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SearchAPI:
+    def __init__(self, daemon, host="127.0.0.1", port=8765, max_wait=300):
+        self.daemon = daemon
+        self.max_wait = max_wait
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    def url(self, path="/"):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="SearchAPI", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _search(self, body):
+        sites = body.get("sites") or [body.get("site")]
+        params = body.get("params")
+        if not isinstance(params, dict):
+            raise ValueError("Нужен объект params с test_data")
+        priority = int(body.get("priority", 0))
+        # Сначала проверяем все сайты: ошибка в последнем не должна оставить в очереди поиски по первым
+        for site in sites:
+            self.daemon.validate(site, params)
+        jobs = []
+        for site in sites:
+            job, coalesced = self.daemon.submit(site, params, priority)
+            jobs.append((job, coalesced))
+        wait = min(float(body.get("wait", 0)), self.max_wait)
+        deadline = time.time() + wait
+        for job, _ in jobs:
+            self.daemon.wait(job, max(0.0, deadline - time.time()))
+        views = [dict(job.view(), coalesced=coalesced) for job, coalesced in jobs]
+        return (200 if all(job.done.is_set() for job, _ in jobs) else 202), {"jobs": views}
+
+    def _job(self, job_id, query):
+        job = self.daemon.get(job_id)
+        if job is None:
+            return 404, {"error": f"Нет задачи {job_id}"}
+        wait = min(float(query.get("wait", ["0"])[0]), self.max_wait)
+        if wait:
+            self.daemon.wait(job, wait)
+        return 200, job.view()
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/status":
+                    self._reply(200, api.daemon.status())
+                elif url.path == "/metrics":
+                    self._reply(200, METRICS.to_prometheus())
+                elif url.path.startswith("/jobs/"):
+                    self._guarded(lambda: api._job(url.path[len("/jobs/"):], parse_qs(url.query)))
+                else:
+                    self._reply(404, {"error": "Нет такого адреса"})
+
+            def do_POST(self):
+                if urlsplit(self.path).path != "/search":
+                    self._reply(404, {"error": "Нет такого адреса"})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"error": "Тело запроса — не JSON"})
+                    return
+                self._guarded(lambda: api._search(body))
+
+            def _guarded(self, action):
+                try:
+                    self._reply(*action())
+                except QueueFull as e:
+                    self._reply(429, {"error": str(e)})
+                except (ValueError, KeyError, TypeError) as e:
+                    self._reply(400, {"error": str(e)})
+                except RuntimeError as e:
+                    self._reply(503, {"error": str(e)})
+
+            def _reply(self, code, body):
+                if isinstance(body, str):
+                    payload, content_type = body.encode(), "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    payload, content_type = json.dumps(body, ensure_ascii=False).encode(), "application/json; charset=utf-8"
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Демон поиска с локальным HTTP/JSON API: POST /search, GET /jobs/<id>, GET /status")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--browsers", type=int, default=None, help="Слотов браузера (по умолчанию — по памяти и ядрам)")
+    parser.add_argument("--queue", type=int, default=100, help="Максимум задач в очереди, сверх — 429")
+    parser.add_argument("--cache", default=None, help="SQLite-файл кэша результатов")
+    parser.add_argument("--cache-ttl", type=int, default=300)
+    parser.add_argument("--history", default=None, help="SQLite-файл для истории цен")
+    parser.add_argument("--catalog", default=None, help="JSON справочников для проверки запросов")
+    parser.add_argument("--lean", action="store_true")
+    parser.add_argument("--inject", action="store_true")
+    args = parser.parse_args()
+
+    search_daemon = SearchDaemon(
+        slots=args.browsers, max_queue=args.queue,
+        cache=ResultCache(ttl=args.cache_ttl, path=args.cache) if args.cache else None,
+        history=HistoryStore(args.history) if args.history else None,
+        catalog=Catalog(args.catalog) if args.catalog else None,
+        lean=args.lean, inject=args.inject,
+    ).start()
+    api_server = SearchAPI(search_daemon, args.host, args.port)
+    print(f"🛰️ Демон поиска слушает {api_server.url()} — слотов браузера: {search_daemon.slots}")
+    try:
+        api_server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Останавливаем демон")
+    finally:
+        api_server.stop()
+        search_daemon.close()
+        if search_daemon.history:
+            search_daemon.history.close()
@@ -0,0 +1,108 @@
+import re
+from urllib.parse import urlencode
+from result_cache import normalize_city, normalize_tourists
+
+
+# Внутренние идентификаторы сайтов. Операторы сюда вносятся только после сверки с выдачей сайта:
+# если нужного ID нет, ссылка не строится и поиск идёт через форму.
+DEEP_LINK_IDS = {
+    "tourvisor": {
+        "cities": {
+            "москва": 1, "пермь": 2, "екатеринбург": 3, "уфа": 4, "с.петербург": 5, "челябинск": 6,
+            "самара": 7, "нижний новгород": 8, "новосибирск": 9, "казань": 10,
+        },
+        "countries": {
+            "египет": 1, "таиланд": 2, "индия": 3, "турция": 4, "тунис": 5, "греция": 6, "оаэ": 9,
+        },
+        "operators": {},
+    },
+    "sletat": {
+        "cities": {"москва": 832, "с.петербург": 1264},
+        "countries": {"турция": 119, "египет": 29},
+        "operators": {},
+    },
+}
+
+URLS = {
+    "tourvisor": "https://tourvisor.ru/search.php#!/?{query}",
+    "sletat": "https://sletat.ru/b2b/?{query}",
+}
+
+
+class DeepLinkError(ValueError):
+    pass
+
+
+def _lookup(site, table, value):
+    key = normalize_city(value) if table == "cities" else str(value).strip().lower()
+    ids = DEEP_LINK_IDS[site][table]
+    if key not in ids:
+        raise DeepLinkError(f"Нет ID для '{value}' ({table}) на {site}")
+    return ids[key]
+
+
+def _nights(value):
+    match = re.fullmatch(r"\s*(\d+)\s*-\s*(\d+)\s*", str(value))
+    if not match:
+        raise DeepLinkError(f"Не удалось разобрать ночи: {value}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _operator_ids(site, operators):
+    selected = [key for key, flag in (operators or {}).items() if flag]
+    return [str(_lookup(site, "operators", key)) for key in selected]
+
+
+def tourvisor_url(test_data, base=None):
+    nights_from, nights_to = _nights(test_data["nights"])
+    dep, ret = test_data["departure_dates"]
+    params = {
+        "s_flyfrom": _lookup("tourvisor", "cities", test_data["departure_city"]),
+        "s_country": _lookup("tourvisor", "countries", test_data["destination_country"]),
+        "s_j_date_from": dep,
+        "s_j_date_to": ret,
+        "s_nights_from": nights_from,
+        "s_nights_to": nights_to,
+        "s_adults": normalize_tourists(test_data["tourists"]),
+        "s_child": 0,
+        "s_action": "search",
+    }
+    if test_data.get("charter", 1):
+        params["s_charter"] = 1
+    operators = _operator_ids("tourvisor", test_data.get("operators"))
+    if operators:
+        params["s_operators"] = ",".join(operators)
+    return (base or URLS["tourvisor"]).format(query=urlencode(params))
+
+
+def sletat_url(test_data, base=None):
+    nights_from, nights_to = _nights(test_data["nights"])
+    dep, ret = test_data["departure_dates"]
+    params = {
+        "cityFromId": _lookup("sletat", "cities", test_data["departure_city"]),
+        "countryId": _lookup("sletat", "countries", test_data["destination_country"]),
+        "s_departFrom": dep,
+        "s_departTo": ret,
+        "s_nightsMin": nights_from,
+        "s_nightsMax": nights_to,
+        "s_adults": normalize_tourists(test_data["tourists"]),
+        "s_kids": 0,
+    }
+    if test_data.get("charter"):
+        params["s_charter"] = 1
+    if test_data.get("direct"):
+        params["s_direct"] = 1
+    operators = _operator_ids("sletat", test_data.get("operators"))
+    if operators:
+        params["s_operators"] = ",".join(operators)
+    return (base or URLS["sletat"]).format(query=urlencode(params))
+
+
+BUILDERS = {"tourvisor": tourvisor_url, "sletat": sletat_url}
+
+
+def build_url(site, test_data, base=None):
+    try:
+        return BUILDERS[site](test_data, base), None
+    except DeepLinkError as e:
+        return None, str(e)
@@ -0,0 +1,249 @@
+import os
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from lean import apply_lean_options, block_resources
+
+
+SITE_ARGUMENTS = {
+    "tourvisor": ["--disable-blink-features=AutomationControlled"],
+    "sletat": ["--disable-blink-features=AutomationControlled", "--no-sandbox", "--disable-dev-shm-usage"],
+}
+
+
+def available_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def build_chrome_options(site, capture_network=False, lean=False):
+    options = webdriver.ChromeOptions()
+    for arg in SITE_ARGUMENTS.get(site, SITE_ARGUMENTS["tourvisor"]):
+        options.add_argument(arg)
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    if capture_network:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if lean:
+        apply_lean_options(options, site)
+    return options
+
+
+def create_driver(site, capture_network=False, lean=False):
+    driver = webdriver.Chrome(options=build_chrome_options(site, capture_network, lean))
+    try:
+        if lean:
+            block_resources(driver, site)
+        else:
+            driver.maximize_window()
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    except Exception:
+        # Chrome уже запущен, а вызывающий драйвер не получит — закрываем здесь, иначе процессы осиротеют
+        driver.quit()
+        raise
+    return driver
+
+
+def check_pool_profile(pool, lean, capture):
+    # Браузеры пула уже запущены со своими опциями — флаг поиска, не совпавший с ними, молча не сработал бы
+    if bool(getattr(pool, "lean", False)) != bool(lean):
+        raise ValueError(f"Поиск с lean={lean}, а пул запускает браузеры с lean={getattr(pool, 'lean', False)}")
+    if capture and not getattr(pool, "capture", False):
+        raise ValueError("Захват сети требует performance-лог: создайте пул с capture=True или ищите без пула")
+
+
+class _PooledDriver:
+    def __init__(self, site, driver):
+        self.site = site
+        self.driver = driver
+        self.uses = 0
+        self.created = time.time()
+        self.last_used = time.time()
+
+
+class DriverPool:
+    def __init__(self, size=2, max_uses=20, idle_timeout=300, factory=None, max_age=None, recycle=None, lean=False, capture=False):
+        self.size = size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        # Профиль браузеров задаёт пул: поиск не может включить lean или захват сети на чужом драйвере.
+        # Своя factory должна запускать браузер с тем же профилем
+        self.lean = lean
+        self.capture = capture
+        self.factory = factory or functools.partial(create_driver, capture_network=capture, lean=lean)
+        self.max_age = max_age
+        # recycle(driver) -> bool: внешняя проверка, например по памяти процессов браузера
+        self.recycle = recycle
+        self.recycled = {}
+        self._idle = []
+        self._busy = {}
+        self._lock = threading.Condition()
+        self._closed = False
+
+    def acquire(self, site, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Пул драйверов закрыт")
+                self._evict_idle_locked()
+                entry = self._take_idle_locked(site)
+                if entry:
+                    break
+                if len(self._idle) + len(self._busy) < self.size:
+                    entry = None
+                    break
+                if self._idle:
+                    # Свободен только драйвер другого сайта — освобождаем под нужный
+                    self._quit(self._idle.pop(0))
+                    continue
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"Нет свободного драйвера для {site}")
+                self._lock.wait(remaining)
+            if entry is None:
+                # Резервируем слот до запуска Chrome, чтобы не превысить size
+                entry = _PooledDriver(site, None)
+                self._busy[id(entry)] = entry
+                reserved = True
+            else:
+                reserved = False
+        if reserved:
+            try:
+                driver = self.factory(site)
+            except Exception:
+                with self._lock:
+                    self._busy.pop(id(entry), None)
+                    self._lock.notify()
+                raise
+            with self._lock:
+                del self._busy[id(entry)]
+                entry.driver = driver
+                self._busy[id(driver)] = entry
+        entry.uses += 1
+        entry.last_used = time.time()
+        return entry.driver
+
+    def release(self, driver, discard=False):
+        with self._lock:
+            entry = self._busy.pop(id(driver), None)
+        if entry is None:
+            return
+        if discard or entry.uses >= self.max_uses or self._worn_out(entry) or not self._reset(driver):
+            self._quit(entry)
+            with self._lock:
+                self._lock.notify()
+            return
+        entry.last_used = time.time()
+        with self._lock:
+            if self._closed:
+                self._quit(entry)
+            else:
+                self._idle.append(entry)
+            self._lock.notify()
+
+    @contextmanager
+    def driver(self, site, timeout=None):
+        driver = self.acquire(site, timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle_locked()
+            self._lock.notify_all()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for entry in idle:
+            self._quit(entry)
+
+    def drivers(self):
+        with self._lock:
+            return [entry.driver for entry in self._idle + list(self._busy.values()) if entry.driver is not None]
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "busy": len(self._busy), "size": self.size, "recycled": dict(self.recycled)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _take_idle_locked(self, site):
+        for entry in list(self._idle):
+            if entry.site != site:
+                continue
+            self._idle.remove(entry)
+            if self._is_healthy(entry.driver):
+                self._busy[id(entry.driver)] = entry
+                return entry
+            self._quit(entry)
+        return None
+
+    def _evict_idle_locked(self):
+        now = time.time()
+        for entry in list(self._idle):
+            if now - entry.last_used > self.idle_timeout:
+                self._idle.remove(entry)
+                self._quit(entry)
+
+    def _worn_out(self, entry):
+        reason = None
+        if self.max_age and time.time() - entry.created > self.max_age:
+            reason = "age"
+        elif self.recycle:
+            try:
+                reason = "recycle" if self.recycle(entry.driver) else None
+            except Exception:
+                reason = None
+        if reason:
+            with self._lock:
+                self.recycled[reason] = self.recycled.get(reason, 0) + 1
+        return reason is not None
+
+    def _is_healthy(self, driver):
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except Exception:
+                pass
+            try:
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            except Exception:
+                driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            print(f"⚠️ Не удалось сбросить драйвер: {e}")
+            return False
+
+    def _quit(self, entry):
+        if entry.driver is None:
+            return
+        try:
+            entry.driver.quit()
+        except Exception:
+            pass
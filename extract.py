@@ -0,0 +1,103 @@
+import re
+from selenium.common.exceptions import WebDriverException
+
+
+CURRENCIES = [
+    ("₽", "RUB"), ("руб", "RUB"), ("rub", "RUB"),
+    ("$", "USD"), ("usd", "USD"),
+    ("€", "EUR"), ("eur", "EUR"),
+    ("₸", "KZT"), ("тг", "KZT"),
+    ("byn", "BYN"), ("бел", "BYN"),
+]
+
+_AMOUNT_RE = re.compile(r"\d[\d\s]*")
+
+TOURVISOR_OPERATORS_JS = """
+const body = document.querySelector('.TVOperatorFilterColumnBody');
+if (!body) return null;
+const text = (item, sel) => {
+    const el = item.querySelector(sel);
+    return el ? el.innerText.trim() : '';
+};
+return Array.from(body.querySelectorAll('.TVOperatorFilterItemControl')).map(item => ({
+    name: text(item, '.TVCheckBox'),
+    price: text(item, '.TVOperatorFilterItemPriceValue'),
+    currency: text(item, '.TVOperatorFilterItemPriceCurrency'),
+}));
+"""
+
+SLETAT_OPERATORS_JS = """
+const container = document.querySelector('.blinchik__operator-container');
+if (!container) return null;
+return Array.from(container.querySelectorAll('li.blinchik__operator-item')).map(item => {
+    const label = item.querySelector('label');
+    if (!label) return null;
+    const price = item.querySelector('.blinchik__price .sr-currency-rub');
+    return {
+        name: ((label.childNodes[0] && label.childNodes[0].textContent) || '').trim(),
+        disabled: label.classList.contains('uis-checkbox__label_disabled'),
+        price: price ? price.innerText.trim() : '',
+    };
+});
+"""
+
+
+def parse_amount(text):
+    match = _AMOUNT_RE.search(text or "")
+    if not match:
+        return None
+    digits = re.sub(r"\D", "", match.group())
+    return int(digits) if digits else None
+
+
+def currency_code(text, default="RUB"):
+    lowered = (text or "").lower()
+    for marker, code in CURRENCIES:
+        if marker in lowered:
+            return code
+    return default
+
+
+def parse_price(text, default_currency="RUB"):
+    return parse_amount(text), currency_code(text, default_currency)
+
+
+def make_operator(name, price_text, currency_text=""):
+    amount = parse_amount(price_text)
+    return {
+        "name": name,
+        "price": f"{price_text} {currency_text}".strip(),
+        "amount": amount,
+        "currency": currency_code(currency_text or price_text),
+    }
+
+
+def bulk_tourvisor_operators(driver):
+    try:
+        rows = driver.execute_script(TOURVISOR_OPERATORS_JS)
+    except WebDriverException:
+        return None
+    if not rows:
+        return None
+    ops = [make_operator(r["name"], r["price"], r["currency"]) for r in rows if r["name"] and r["price"]]
+    # Строки есть, но ни одна не разобралась — скорее всего, поменялась вёрстка
+    return ops or None
+
+
+def bulk_sletat_operators(driver):
+    try:
+        rows = driver.execute_script(SLETAT_OPERATORS_JS)
+    except WebDriverException:
+        return None
+    if not rows:
+        return None
+    ops = []
+    for r in rows:
+        if not r or r["disabled"]:
+            continue
+        amount = parse_amount(r["price"])
+        if amount is not None:
+            ops.append({"name": r["name"], "price": f"{amount} ₽", "amount": amount, "currency": "RUB"})
+    if not ops and not any(r and r["name"] for r in rows):
+        return None
+    return ops
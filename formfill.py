@@ -0,0 +1,269 @@
+import time
+from selenium.common.exceptions import WebDriverException
+
+
+# Весь сценарий заполнения выполняется в странице: один execute_async_script вместо сотен команд WebDriver
+FORM_FILL_JS = """
+const steps = arguments[0], waitMs = arguments[1], deadline = Date.now() + arguments[2];
+const done = arguments[arguments.length - 1];
+const MONTHS = ['январ', 'феврал', 'март', 'апрел', 'ма', 'июн', 'июл', 'август', 'сентябр', 'октябр', 'ноябр', 'декабр'];
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+const text = el => (el ? el.textContent : '').replace(/\\s+/g, ' ').trim();
+const lower = value => String(value).toLowerCase();
+const shown = el => !!el && el.isConnected && el.getClientRects().length > 0;
+const all = (sel, root) => Array.from((root || document).querySelectorAll(sel));
+const number = value => { const m = String(value).match(/\\d+/); return m ? +m[0] : null; };
+const includes = (el, value) => lower(text(el)).includes(lower(value));
+
+// Цель — селектор или пара [селектор, текст]; кликаем только видимые элементы, как это делал бы пользователь
+function locate(target, root) {
+    if (!target) return null;
+    const [sel, label] = Array.isArray(target) ? target : [target, null];
+    return all(sel, root).find(el => shown(el) && (label === null || includes(el, label)));
+}
+
+async function waitFor(check, what) {
+    const limit = Math.min(Date.now() + waitMs, deadline);
+    for (;;) {
+        const value = check();
+        if (value) return value;
+        if (Date.now() > limit) throw new Error('не дождались: ' + what);
+        await sleep(25);
+    }
+}
+
+function quiet(target, ms) {
+    const root = typeof target === 'string' ? document.querySelector(target) : target;
+    if (!root) return Promise.resolve();
+    return new Promise(resolve => {
+        let timer = null;
+        const observer = new MutationObserver(() => {
+            clearTimeout(timer);
+            timer = setTimeout(finish, ms);
+        });
+        const limit = setTimeout(finish, Math.min(waitMs, Math.max(0, deadline - Date.now())));
+        function finish() {
+            observer.disconnect();
+            clearTimeout(timer);
+            clearTimeout(limit);
+            resolve();
+        }
+        observer.observe(root, {subtree: true, childList: true, attributes: true, characterData: true});
+        timer = setTimeout(finish, ms);
+    });
+}
+
+function press(el) {
+    el.scrollIntoView({block: 'center'});
+    const init = {bubbles: true, cancelable: true, view: window};
+    el.dispatchEvent(new PointerEvent('pointerdown', init));
+    el.dispatchEvent(new MouseEvent('mousedown', init));
+    el.dispatchEvent(new PointerEvent('pointerup', init));
+    el.dispatchEvent(new MouseEvent('mouseup', init));
+    el.click();
+}
+
+function setValue(el, value) {
+    el.focus();
+    // React следит за value через сеттер прототипа — прямое присваивание он не заметит
+    Object.getOwnPropertyDescriptor(Object.getPrototypeOf(el), 'value').set.call(el, value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+}
+
+function dismiss() {
+    const corner = document.elementFromPoint(10, 10);
+    if (corner) corner.click();
+}
+
+async function open(step) {
+    press(await waitFor(() => locate(step.trigger), 'поля'));
+}
+
+const actions = {
+    async pick(step) {
+        await open(step);
+        const option = await waitFor(() => all(step.option).find(el => shown(el) && includes(step.match ? el.querySelector(step.match) : el, step.value)), step.value);
+        press(option);
+        if (step.verify) await waitFor(() => includes(document.querySelector(step.verify), step.value), 'выбора ' + step.value);
+    },
+
+    async type_pick(step) {
+        const input = await waitFor(() => locate(step.trigger), 'поля ввода');
+        press(input);
+        setValue(input, step.value);
+        const option = await waitFor(() => all(step.option).find(el => shown(el) && includes(el, step.value)), step.value);
+        press(option);
+        await waitFor(() => lower(input.value).includes(lower(step.value)), 'выбора ' + step.value);
+    },
+
+    async calendar(step) {
+        await open(step);
+        await waitFor(() => locate(step.cell), 'календаря');
+        const title = () => step.title.map(sel => text(document.querySelector(sel))).join(' ');
+        const dayOf = cell => step.day_attr ? cell.getAttribute(step.day_attr) : text(step.day_text ? cell.querySelector(step.day_text) : cell);
+        for (const date of step.value) {
+            for (let turn = 0; ; turn++) {
+                const shownTitle = title(), lowered = lower(shownTitle);
+                const month = MONTHS.findIndex(m => lowered.split(' ').some(word => word.startsWith(m))) + 1;
+                const year = number(lowered.match(/\\d{4}/) || '');
+                if (!month || !year) throw new Error('непонятный заголовок календаря: ' + shownTitle);
+                const diff = (date.year - year) * 12 + date.month - month;
+                if (!diff) break;
+                const button = turn < 24 && locate(diff > 0 ? step.next : step.prev);
+                if (!button) throw new Error('не листается календарь к ' + date.month + '.' + date.year);
+                press(button);
+                await waitFor(() => title() !== shownTitle, 'смены месяца');
+            }
+            const cell = await waitFor(() => all(step.cell).find(el => shown(el) && dayOf(el) === String(date.day)), 'дня ' + date.day);
+            press(cell);
+            await quiet(step.popup || cell.parentNode, 150);
+        }
+        if (step.confirm) press(await waitFor(() => locate(step.confirm), 'кнопки подтверждения'));
+        if (step.close) dismiss();
+    },
+
+    async range(step) {
+        await open(step);
+        for (const value of step.value) {
+            const cell = await waitFor(() => all(step.cell).find(el => shown(el) && text(el.querySelector(step.label)) === String(value)), 'ячейки ' + value);
+            press(cell);
+            await quiet(cell.parentNode, 100);
+        }
+    },
+
+    async inputs(step) {
+        step.value.forEach(([sel, value]) => {
+            const input = document.querySelector(sel);
+            if (input) setValue(input, String(value));
+        });
+        await waitFor(() => step.value.every(([sel, value]) => {
+            const input = document.querySelector(sel);
+            return !input || input.value === String(value);
+        }), 'значений');
+    },
+
+    async counter(step) {
+        await open(step);
+        const count = () => number(text(locate(step.count) || document.querySelector(step.count)));
+        await waitFor(() => count() !== null, 'счётчика');
+        for (let turn = 0; turn < 20 && count() !== step.value; turn++) {
+            const current = count(), up = current < step.value;
+            if (!up && !step.minus) break;
+            press(await waitFor(() => locate(up ? step.plus : step.minus), up ? 'кнопки +' : 'кнопки −'));
+            await waitFor(() => count() === current + (up ? 1 : -1), 'счётчика ' + (current + (up ? 1 : -1)));
+        }
+        if (step.minus && count() !== step.value) throw new Error('счётчик остался на ' + count());
+        press(await waitFor(() => locate(step.confirm || step.trigger), 'закрытия'));
+        if (step.verify) await waitFor(() => number(text(document.querySelector(step.verify))) === step.value, 'подписи поля');
+    },
+
+    async checkboxes(step, report) {
+        await open(step);
+        if (step.list) await waitFor(() => locate(step.list), 'списка');
+        const checked = el => step.checked_class ? el.classList.contains(step.checked_class) : !!(el.querySelector('input') || el).checked;
+        if (step.clear_all) {
+            const box = document.querySelector(step.clear_all);
+            if (box && box.checked) {
+                box.click();
+                await waitFor(() => !box.checked, 'снятия «все»');
+            }
+        }
+        report.picked = [];
+        report.missing = [];
+        for (const name of step.value) {
+            if (step.search) setValue(document.querySelector(step.search), name);
+            const matches = el => {
+                const label = text(step.match ? el.querySelector(step.match) : el);
+                return step.exact ? label === name : label.includes(name);
+            };
+            let item;
+            try {
+                item = await waitFor(() => all(step.item).find(el => shown(el) && matches(el) && !(step.disabled && el.matches(step.disabled))), name);
+            } catch (e) {
+                report.missing.push(name);
+                continue;
+            }
+            if (!checked(item)) {
+                press(item);
+                await waitFor(() => checked(item), 'отметки ' + name);
+            }
+            report.picked.push(name);
+        }
+    },
+
+    async toggle(step) {
+        for (const {text: label, on} of step.value) {
+            if (!on && step.enable_only) continue;
+            const item = await waitFor(() => locate([step.item, label]), label);
+            const box = step.checked_class ? item : (item.querySelector('input') || item);
+            const checked = () => step.checked_class ? box.classList.contains(step.checked_class) : box.checked;
+            if (checked() !== on) {
+                press(box);
+                await waitFor(() => checked() === on, label);
+            }
+        }
+    },
+};
+
+(async () => {
+    const report = [];
+    let failed = false;
+    for (const step of steps) {
+        const entry = {field: step.field, action: step.action, ok: false};
+        report.push(entry);
+        if (failed) {
+            entry.skipped = true;
+            continue;
+        }
+        const start = performance.now();
+        try {
+            await actions[step.action](step, entry);
+            entry.ok = true;
+        } catch (e) {
+            entry.error = String(e && e.message || e).slice(0, 200);
+            failed = true;
+            // Незакрытый выпадающий список помешал бы Python-шагам, которые продолжат заполнение
+            if (document.activeElement) document.activeElement.blur();
+            dismiss();
+        }
+        entry.ms = Math.round(performance.now() - start);
+    }
+    done(report);
+})();
+"""
+
+
+def compile_form(spec, test_data, fields=None):
+    steps = []
+    for field, action, options, value in spec:
+        if fields is not None and field not in fields:
+            continue
+        compiled = value(test_data)
+        # None — значение, которое скрипт не берётся выставить; поле заполнит Python-шаг
+        if compiled is None:
+            continue
+        steps.append({"field": field, "action": action, "value": compiled, **options})
+    return steps
+
+
+def inject_form(driver, waits, spec, test_data, fields=None, wait_timeout=5, budget=60):
+    steps = compile_form(spec, test_data, fields)
+    if not steps:
+        return []
+    start = time.time()
+    # Бюджет скрипта чуть меньше таймаута WebDriver, чтобы по таймауту он не продолжал кликать параллельно с Python
+    waits.script_timeout(budget + 5)
+    try:
+        report = driver.execute_async_script(FORM_FILL_JS, steps, int(wait_timeout * 1000), int(budget * 1000))
+    except WebDriverException as e:
+        print(f"⚠️ Скрипт заполнения формы не отработал: {type(e).__name__}")
+        report = [{"field": s["field"], "action": s["action"], "ok": False, "error": str(e).strip()[:200]} for s in steps]
+    done = [r["field"] for r in report if r["ok"]]
+    print(f"⚡ Скрипт заполнил {len(done)}/{len(steps)} полей за {time.time() - start:.1f} сек")
+    for r in report:
+        if r.get("error"):
+            print(f"⚠️ Поле {r['field']} доделает Python: {r['error']}")
+        for name in r.get("missing", []):
+            print(f"⚠️ Не удалось выбрать {name}: нет в списке операторов")
+    return report
@@ -0,0 +1,190 @@
+import re
+import json
+import time
+import sqlite3
+import pathlib
+import threading
+from datetime import datetime
+from result_cache import normalize_city, normalize_params
+
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "id INTEGER PRIMARY KEY, site TEXT NOT NULL, started_at REAL NOT NULL, route TEXT NOT NULL, "
+    "date_from TEXT, date_to TEXT, nights TEXT, tourists INTEGER, params TEXT NOT NULL, "
+    "success INTEGER NOT NULL, duration REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS steps ("
+    "run_id INTEGER NOT NULL REFERENCES runs (id), name TEXT NOT NULL, seconds REAL NOT NULL, ok INTEGER NOT NULL, reason TEXT)",
+    "CREATE TABLE IF NOT EXISTS prices ("
+    "run_id INTEGER NOT NULL REFERENCES runs (id), site TEXT NOT NULL, route TEXT NOT NULL, depart_date TEXT, "
+    "observed_at REAL NOT NULL, operator TEXT NOT NULL, amount INTEGER NOT NULL, currency TEXT)",
+    "CREATE INDEX IF NOT EXISTS runs_route ON runs (route, started_at)",
+    "CREATE INDEX IF NOT EXISTS runs_site ON runs (site, route, started_at)",
+    "CREATE INDEX IF NOT EXISTS steps_run ON steps (run_id, name)",
+    "CREATE INDEX IF NOT EXISTS prices_history ON prices (route, operator, observed_at)",
+    "CREATE INDEX IF NOT EXISTS prices_by_day ON prices (route, depart_date, amount)",
+    "CREATE INDEX IF NOT EXISTS prices_operator ON prices (operator, observed_at)",
+]
+
+
+def route_key(departure_city, destination_country):
+    return f"{normalize_city(departure_city)}|{str(destination_country).strip().lower()}"
+
+
+def operator_key(name):
+    return re.sub(r"\s+", " ", str(name)).strip().lower()
+
+
+def iso_date(value):
+    # Формы сайтов работают с ДД.ММ.ГГГГ, в базе храним ISO — так работает сортировка и диапазоны
+    try:
+        return datetime.strptime(str(value).strip(), "%d.%m.%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return str(value).strip() or None
+
+
+class HistoryStore:
+    def __init__(self, path="history.db", batch_size=50, flush_interval=5.0, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        if readonly:
+            # Воркеры пакета только читают тайминги — писатель у базы один, основной процесс
+            uri = pathlib.Path(path).absolute().as_uri() + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False, isolation_level=None)
+            return
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+
+    def record(self, site, test_data, result, observed_at=None):
+        if self.readonly:
+            raise RuntimeError(f"История {self.path} открыта только для чтения")
+        # Ответ из кэша уже лежит в истории с момента настоящего поиска
+        if result.get("cache", {}).get("state") in ("hit", "stale"):
+            return False
+        with self._lock:
+            self._pending.append((site, test_data, result, observed_at or time.time()))
+            due = len(self._pending) >= self.batch_size or time.time() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+        return True
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.time()
+            if not pending:
+                return 0
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                for site, test_data, result, observed_at in pending:
+                    self._insert(cur, site, test_data, result, observed_at)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                self._pending = pending + self._pending
+                raise
+        return len(pending)
+
+    def _insert(self, cur, site, test_data, result, observed_at):
+        params = normalize_params(test_data)
+        route = route_key(params["departure_city"], params["destination_country"])
+        dates = params["departure_dates"] + [None, None]
+        date_from, date_to = iso_date(dates[0]) if dates[0] else None, iso_date(dates[1]) if dates[1] else None
+        cur.execute(
+            "INSERT INTO runs (site, started_at, route, date_from, date_to, nights, tourists, params, success, duration) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (site, observed_at, route, date_from, date_to, params["nights"], params["tourists"],
+             json.dumps(params, ensure_ascii=False), int(bool(result.get("success"))), result.get("duration", 0.0)),
+        )
+        run_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO steps (run_id, name, seconds, ok, reason) VALUES (?, ?, ?, ?, ?)",
+            [(run_id, s["name"], s["seconds"], int(s["ok"]), s.get("reason")) for s in result.get("spans", [])],
+        )
+        cur.executemany(
+            "INSERT INTO prices (run_id, site, route, depart_date, observed_at, operator, amount, currency) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, site, route, date_from, observed_at, operator_key(op["name"]), op["amount"], op.get("currency"))
+             for op in result.get("operators", []) if op.get("amount") is not None],
+        )
+
+    def price_history(self, operator, departure_city, destination_country, site=None, since=None, depart_date=None):
+        query = "SELECT observed_at, depart_date, amount, currency, site FROM prices WHERE route = ? AND operator = ?"
+        args = [route_key(departure_city, destination_country), operator_key(operator)]
+        if since is not None:
+            query += " AND observed_at >= ?"
+            args.append(since)
+        if depart_date is not None:
+            query += " AND depart_date = ?"
+            args.append(iso_date(depart_date))
+        if site is not None:
+            query += " AND site = ?"
+            args.append(site)
+        query += " ORDER BY observed_at"
+        return self._rows(query, args, ("observed_at", "depart_date", "amount", "currency", "site"), args[0])
+
+    def cheapest_per_day(self, departure_city, destination_country, date_from=None, date_to=None, site=None, since=None):
+        # SQLite отдаёт остальные столбцы из строки, на которой достигнут MIN
+        query = "SELECT depart_date, MIN(amount), currency, operator, site, observed_at FROM prices WHERE route = ?"
+        args = [route_key(departure_city, destination_country)]
+        if date_from is not None:
+            query += " AND depart_date >= ?"
+            args.append(iso_date(date_from))
+        if date_to is not None:
+            query += " AND depart_date <= ?"
+            args.append(iso_date(date_to))
+        if site is not None:
+            query += " AND site = ?"
+            args.append(site)
+        if since is not None:
+            query += " AND observed_at >= ?"
+            args.append(since)
+        query += " GROUP BY depart_date ORDER BY depart_date"
+        return self._rows(query, args, ("depart_date", "amount", "currency", "operator", "site", "observed_at"), args[0])
+
+    def step_timings(self, site, step, departure_city=None, destination_country=None, limit=500):
+        query = "SELECT s.seconds, s.ok, s.reason FROM steps s JOIN runs r ON r.id = s.run_id WHERE r.site = ? AND s.name = ?"
+        args = [site, step]
+        if departure_city is not None and destination_country is not None:
+            query += " AND r.route = ?"
+            args.append(route_key(departure_city, destination_country))
+        query += " ORDER BY r.started_at DESC LIMIT ?"
+        args.append(limit)
+        return self._rows(query, args, ("seconds", "ok", "reason"))
+
+    def _rows(self, query, args, columns, route=None):
+        # Сбрасываем пачку, только если в ней есть цены запрошенного маршрута: иначе каждое чтение
+        # превращалось бы в отдельный коммит. Тайминги шагов (route=None) свежесть в секунды не требуют
+        if route is not None and self._pending_route(route):
+            self.flush()
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def _pending_route(self, route):
+        with self._lock:
+            pending = [test_data for _, test_data, _, _ in self._pending]
+        for test_data in pending:
+            params = normalize_params(test_data)
+            if route_key(params["departure_city"], params["destination_country"]) == route:
+                return True
+        return False
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
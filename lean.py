@@ -0,0 +1,96 @@
+import fnmatch
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+
+WINDOW_SIZE = (1280, 900)
+
+LEAN_ARGUMENTS = [
+    "--headless=new",
+    f"--window-size={WINDOW_SIZE[0]},{WINDOW_SIZE[1]}",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-component-update",
+    "--disable-background-networking",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+    "--no-first-run",
+    "--mute-audio",
+    "--renderer-process-limit=2",
+    "--disk-cache-size=33554432",
+    "--js-flags=--max-old-space-size=256",
+]
+
+BLOCKED_TYPES = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.ico", "*.svg"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*fonts.googleapis.com*", "*fonts.gstatic.com*"],
+    "media": ["*.mp4", "*.webm", "*.mp3"],
+}
+
+TRACKERS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*mc.yandex.ru*", "*an.yandex.ru*", "*yandex.ru/ads*", "*top-fwz1.mail.ru*", "*vk.com/rtrg*",
+    "*connect.facebook.net*", "*jivosite.com*", "*code.jivo.ru*", "*hotjar.com*", "*criteo.com*",
+]
+
+LEAN_PROFILES = {
+    "tourvisor": {
+        "block_types": ["images", "fonts", "media"],
+        "deny": TRACKERS,
+        "allow": [],
+        "required": ["div.TVDepartureFilter", "div.TVCountryFilter", "div.TVFlyDatesFilter", "div.TVSearchButton"],
+    },
+    "sletat": {
+        "block_types": ["images", "fonts", "media"],
+        "deny": TRACKERS,
+        # Крестик рекламного баннера — svg-иконка, без неё open_sletat не найдёт .icon-remove
+        "allow": ["*.svg"],
+        "required": ["input.excludeClickOutside", "#ui-select-country-to", "[data-testid='b2b.search-form.search-btn']"],
+    },
+}
+
+
+def blocked_patterns(site):
+    profile = LEAN_PROFILES.get(site, LEAN_PROFILES["tourvisor"])
+    patterns = list(profile["deny"])
+    for kind in profile["block_types"]:
+        patterns.extend(BLOCKED_TYPES[kind])
+    allow = profile["allow"]
+    # setBlockedURLs не умеет исключения, поэтому разрешённые шаблоны просто убираем из списка
+    return [p for p in patterns if not any(p == a or fnmatch.fnmatch(p, a) for a in allow)]
+
+
+def apply_lean_options(options, site):
+    for arg in LEAN_ARGUMENTS:
+        options.add_argument(arg)
+    blocked = blocked_patterns(site)
+    # Полный запрет картинок на уровне движка — только если ни один графический шаблон не разрешён
+    if all(p in blocked for p in BLOCKED_TYPES["images"]):
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    return options
+
+
+def block_resources(driver, site):
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_patterns(site)})
+        return True
+    except WebDriverException as e:
+        print(f"⚠️ Не удалось включить блокировку ресурсов: {e}")
+        return False
+
+
+def check_widgets(driver, site, timeout=15):
+    missing = []
+    for selector in LEAN_PROFILES.get(site, {}).get("required", []):
+        try:
+            WebDriverWait(driver, timeout).until(EC.visibility_of_element_located((By.CSS_SELECTOR, selector)))
+        except TimeoutException:
+            missing.append(selector)
+            timeout = 1
+    if missing:
+        raise RuntimeError(f"Облегчённый режим: не отрисовались {', '.join(missing)} — поправьте allow-список для {site}")
+    return True
@@ -1,18 +1,278 @@
 import time
+import functools
 import threading
 import re
 from datetime import datetime
-from selenium import webdriver
+from urllib.parse import urlsplit
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException
+from driver_pool import create_driver, check_pool_profile
+from waits import Waiter
+from extract import bulk_tourvisor_operators, bulk_sletat_operators, make_operator
+from netcapture import NetworkCapture, capture_rule
+from metrics import Tracer, traced, METRICS
+from lean import check_widgets
+from streaming import OperatorStream
+from deeplink import build_url
+from completion import CompletionPolicy, policy_for, wait_for_completion, probe_page
+from pipeline import StepPipeline, ESCALATION, DISMISS_JS
+from formfill import inject_form
+from catalog import option_selector
 
 
-class TourvisorSearchTest:
-    def __init__(self):
+TOURVISOR_OPERATORS = {
+    'anex': 'Anex',
+    'biblioglobus': 'Biblioglobus',
+    'funsun': 'FUN&SUN (TUI)',
+    'travelata': 'Travelata',
+    'coral': 'Coral',
+    'sunmar': 'Sunmar',
+    'pegas': 'Pegas Touristik'
+}
+
+
+def _date_parts(value):
+    dt = datetime.strptime(value, "%d.%m.%Y")
+    return {"day": dt.day, "month": dt.month, "year": dt.year}
+
+
+def _nights_pair(value):
+    return [int(n) for n in value.split("-")]
+
+
+def _adults(value):
+    match = re.search(r'(\d+)\s*взросл', str(value))
+    return int(match.group(1)) if match else None
+
+
+MONTH_STEMS = ('январ', 'феврал', 'март', 'апрел', 'ма', 'июн', 'июл', 'август', 'сентябр', 'октябр', 'ноябр', 'декабр')
+
+
+def _numbers(text):
+    return [int(n) for n in re.findall(r'\d+', text or "")]
+
+
+def _shows_date(text, value):
+    # Подпись календаря: день числом, месяц числом или словом — «26.06 - 28.06», «26 июня»
+    dt = datetime.strptime(value, "%d.%m.%Y")
+    numbers = _numbers(text)
+    return dt.day in numbers and (dt.month in numbers or MONTH_STEMS[dt.month - 1] in (text or "").lower())
+
+
+def _shows_nights(text, value):
+    numbers = _numbers(text)
+    return bool(numbers) and [numbers[0], numbers[-1]] == _nights_pair(value)
+
+
+def _label(driver, selector, attribute=None):
+    found = driver.find_elements(By.CSS_SELECTOR, selector)
+    if not found:
+        return ""
+    return (found[0].get_attribute(attribute) if attribute else found[0].text) or ""
+
+
+def _ref(data, field):
+    return (data.get("refs") or {}).get(field)
+
+
+def ref_option(driver, selector, name, label=None, timeout=3):
+    # Опция по ID из справочника — только если она есть и подписана тем же названием.
+    # Иначе None, и шаг выбирает по тексту: устаревший ID не должен валить поиск или выбирать чужой город
+    if not selector:
+        return None
+    try:
+        option = WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+        text = (option.find_element(By.CSS_SELECTOR, label) if label else option).text
+    except WebDriverException:
+        print(f"⚠️ Опции '{name}' по ID из справочника нет — выбираем по названию")
+        return None
+    if name.lower() not in text.strip().lower():
+        print(f"⚠️ По ID из справочника нашлось '{text.strip()}' вместо '{name}' — выбираем по названию")
+        return None
+    return option
+
+
+def _operator_names(data, defaults=None):
+    # Подписи операторов из справочника сайта; без него — встроенная таблица или сам ключ
+    refs = _ref(data, "operators") or {}
+    names = []
+    for key, flag in (data.get("operators") or {}).items():
+        if not flag:
+            continue
+        if key in refs:
+            names.append(refs[key]["name"])
+        elif defaults is None:
+            names.append(key)
+        elif key in defaults:
+            names.append(defaults[key])
+    return names
+
+
+class SearchTestBase:
+    # Общее для сайтов: браузер, конвейер шагов формы и отмена; страница и выдача — в наследниках
+    SITE = None
+    WAIT_TIMEOUT = 15
+    FORM_STEPS = []
+    FORM_SPEC = []
+
+    def __init__(self, pool=None, capture=False, lean=False, deep_link=False, completion=None, inject=False,
+                 policies=None, escalation=None):
+        self.pool = pool
+        self.capture = capture
+        self.lean = lean
+        self.deep_link = deep_link
+        self.inject = inject
+        self.injected = set()
+        self.form_fill = None
+        self.completion = completion or CompletionPolicy()
+        self.completion_info = None
+        self.stale = None
+        self.error = None
+        # Повторы шагов настраиваются на поиск, а не правкой pipeline.POLICIES на весь процесс
+        self.policies = dict(policies or {})
+        self.escalation = dict(ESCALATION, **(escalation or {}))
+        self.pipeline = None
+        self.aborted = False
+        self.network = None
+        self.stream = None
+        self.tracer = Tracer()
         self.driver = None
         self.wait = None
+        self.waits = None
+        self.test_data = None
+
+    @traced("setup")
+    def setup(self):
+        if self.pool:
+            check_pool_profile(self.pool, self.lean, self.capture)
+            self.driver = self.pool.acquire(self.SITE)
+        else:
+            self.driver = create_driver(self.SITE, capture_network=self.capture, lean=self.lean)
+        try:
+            self.wait = WebDriverWait(self.driver, self.WAIT_TIMEOUT)
+            self.waits = Waiter(self.driver)
+            if self.capture:
+                self.network = NetworkCapture(self.driver, capture_rule(self.SITE, [urlsplit(self.URL).netloc]))
+                self.network.start()
+            if self.aborted:
+                raise RuntimeError("Поиск отменён")
+        except Exception:
+            # Браузер уже запущен: не все вызывающие закрывают его после упавшего setup
+            self.teardown(discard=True)
+            raise
+
+    @traced("teardown")
+    def teardown(self, discard=False):
+        if not self.driver:
+            return
+        if self.pool:
+            self.pool.release(self.driver, discard=discard)
+        else:
+            self.driver.quit()
+        self.driver = None
+
+    def abort(self):
+        # Вызывается из другого потока: закрытый браузер обрывает текущую команду WebDriver в run_test
+        self.aborted = True
+        driver, self.driver = self.driver, None
+        if not driver:
+            return
+        try:
+            if self.pool:
+                self.pool.release(driver, discard=True)
+            else:
+                driver.quit()
+        except Exception:
+            pass
+
+    def form_steps(self, test_data):
+        return [(field, functools.partial(getattr(self, step), *args(test_data))) for field, step, args in self.FORM_STEPS]
+
+    @traced("inject_form")
+    def _inject_form(self, test_data, fields=None):
+        self.form_fill = inject_form(self.driver, self.waits, self.FORM_SPEC, test_data, fields)
+        self.injected = {r["field"] for r in self.form_fill if r["ok"]}
+
+    def _unless_injected(self, field, step):
+        if field not in self.injected:
+            step()
+
+    def _fill_steps(self, test_data, fields=None):
+        steps = [(field, step) for field, step in self.form_steps(test_data) if fields is None or field in fields]
+        if not self.inject:
+            return steps
+        # Скрипт заполняет форму за один вызов, Python-шаги доделывают только поля, на которых он споткнулся
+        return [("inject", functools.partial(self._inject_form, test_data, fields))] + [
+            (field, functools.partial(self._unless_injected, field, step)) for field, step in steps
+        ]
+
+    def _restart_browser(self):
+        if self.aborted:
+            raise RuntimeError("Поиск отменён")
+        # Браузер, на котором не прошла даже перезагрузка страницы, в пул не возвращаем
+        self.teardown(discard=True)
+        self.setup()
+
+    def _dismiss_popups(self):
+        self.driver.execute_script(DISMISS_JS)
+
+    def _remember_results(self):
+        # Отпечаток выдачи до нажатия «Найти»: по нему ожидание отличит новый поиск от прежнего на той же странице
+        self.stale = probe_page(self.driver, self.SITE).get("signature")
+
+    def _run_pipeline(self, test_data):
+        steps = [("open", getattr(self, f"open_{self.SITE}"))] + self._fill_steps(test_data) + [("search", self._submit_search)]
+        self.pipeline = StepPipeline(
+            steps, self.escalation, self.policies, restart_browser=self._restart_browser,
+            before_retry=self._dismiss_popups, stop=lambda: self.aborted,
+        )
+        self.pipeline.run()
+
+
+class TourvisorSearchTest(SearchTestBase):
+    SITE = "tourvisor"
+    URL = "https://tourvisor.ru/search.php"
+    # Поле формы, шаг и его аргументы — в порядке заполнения
+    FORM_STEPS = [
+        ("departure_city", "_select_departure_city", lambda d: (d["departure_city"], _ref(d, "departure_city"))),
+        ("destination_country", "_select_destination_country", lambda d: (d["destination_country"], _ref(d, "destination_country"))),
+        ("departure_dates", "_select_departure_dates", lambda d: tuple(d["departure_dates"])),
+        ("nights", "_select_nights", lambda d: (d["nights"],)),
+        ("tourists", "_select_tourists", lambda d: (d["tourists"],)),
+        ("operators", "_select_operators", lambda d: (_operator_names(d, TOURVISOR_OPERATORS),)),
+        ("charter", "_toggle_charter_checkbox", lambda d: (d.get("charter", 1),)),
+    ]
+    # Те же поля для скрипта formfill: действие, селекторы и значение; None — поле остаётся Python-шагу
+    FORM_SPEC = [
+        ("departure_city", "pick", {"trigger": "div.TVDepartureFilter", "option": ".TVDepartureTableBody div", "verify": "div.TVDepartureFilter"},
+         lambda d: d["departure_city"]),
+        ("destination_country", "pick", {"trigger": "div.TVCountryFilter", "option": ".TVCountryAirportList .TVComplexListItem", "verify": "div.TVCountryFilter"},
+         lambda d: d["destination_country"]),
+        ("departure_dates", "calendar", {
+            "trigger": "div.TVFlyDatesFilter", "popup": "div.TVFlyDatesSelectTooltip",
+            "title": [".TVCalendarTitleControlMonth", ".TVCalendarTitleControlYear"],
+            "next": ".TVCalendarSliderViewRightButton:not(.TVDisabled)",
+            "cell": "t-td[data-value]:not(.TVCalendarDisabledCell)", "day_attr": "data-value", "close": True,
+        }, lambda d: [_date_parts(v) for v in d["departure_dates"] if v]),
+        ("nights", "range", {"trigger": "div.TVNightsFilter", "cell": ".TVRangeTableCell", "label": ".TVRangeCellLabel"},
+         lambda d: _nights_pair(d["nights"])),
+        ("tourists", "counter", {
+            "trigger": "div.TVTouristsFilter", "count": ".TVTouristCount.TVTouristAll", "plus": ".TVTouristActionPlus",
+            "minus": ".TVTouristActionMinus", "confirm": [".TVButtonControl", "Выбрать"], "verify": "div.TVTouristsFilter",
+        }, lambda d: _adults(d["tourists"])),
+        ("operators", "checkboxes", {
+            "trigger": "div.TVOperatorListFilter", "list": ".TVOperatorsList", "item": ".TVOperatorsList .TVCheckBox",
+            "disabled": ".TVDisabled", "checked_class": "TVChecked",
+        }, lambda d: _operator_names(d, TOURVISOR_OPERATORS) or None),
+        ("charter", "toggle", {"item": "div.TVCheckboxControl", "checked_class": "TVChecked"},
+         lambda d: [{"text": "Только чартер", "on": d.get("charter", 1) == 1}] if d.get("charter", 1) in (0, 1) else None),
+    ]
+
+    def __init__(self, pool=None, capture=False, lean=False, deep_link=False, completion=None, inject=False,
+                 policies=None, escalation=None):
+        super().__init__(pool, capture, lean, deep_link, completion, inject, policies, escalation)
         self.selected_operators = []
         self.all_operators_with_prices = []
         self.MONTHS_RU = {
@@ -21,24 +281,16 @@ class TourvisorSearchTest:
             9: "Сентябрь", 10: "Октябрь", 11: "Ноябрь", 12: "Декабрь"
         }
 
-    def setup(self):
-        options = webdriver.ChromeOptions()
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
-        self.driver = webdriver.Chrome(options=options)
-        self.driver.maximize_window()
-        self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        self.wait = WebDriverWait(self.driver, 15)
-
+    @traced("open_tourvisor")
     def open_tourvisor(self):
-        self.driver.get("https://tourvisor.ru/search.php")
+        self.driver.get(self.URL)
         self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        if self.lean:
+            check_widgets(self.driver, "tourvisor")
 
     def _safe_click(self, element, description=""):
         try:
-            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
-            time.sleep(0.3)
+            self.waits.settled(element, f"click:{description or 'element'}", scroll=True)
             element.click()
             return True
         except StaleElementReferenceException:
@@ -56,18 +308,24 @@ class TourvisorSearchTest:
             print(f"❌ Таймаут: {description}")
             raise
 
-    def _select_departure_city(self, city):
+    @traced("select_departure_city")
+    def _select_departure_city(self, city, ref=None):
         field = self._wait_for_element(By.CSS_SELECTOR, "div.TVDepartureFilter")
         self._safe_click(field)
         self._wait_for_element(By.CLASS_NAME, "TVDepartureTableBody")
-        option = self._wait_for_element(By.XPATH, f"//div[contains(@class, 'TVDepartureTableBody')]//div[contains(text(), '{city}')][1]")
+        option = ref_option(self.driver, option_selector(".TVDepartureTableBody div", ref), city)
+        if option is None:
+            option = self._wait_for_element(By.XPATH, f"//div[contains(@class, 'TVDepartureTableBody')]//div[contains(text(), '{city}')][1]")
         self._safe_click(option)
 
-    def _select_destination_country(self, country):
+    @traced("select_destination_country")
+    def _select_destination_country(self, country, ref=None):
         field = self._wait_for_element(By.CSS_SELECTOR, "div.TVCountryFilter")
         self._safe_click(field)
         self._wait_for_element(By.XPATH, "//div[contains(@class, 'TVCountryAirportList') and not(contains(@class, 'TVHide'))]")
-        option = self._wait_for_element(By.XPATH, f"//div[contains(@class, 'TVCountryAirportList')]//div[contains(@class, 'TVComplexListItem') and contains(text(), '{country}')][1]")
+        option = ref_option(self.driver, option_selector(".TVCountryAirportList .TVComplexListItem", ref), country)
+        if option is None:
+            option = self._wait_for_element(By.XPATH, f"//div[contains(@class, 'TVCountryAirportList')]//div[contains(@class, 'TVComplexListItem') and contains(text(), '{country}')][1]")
         self._safe_click(option)
 
     def _scroll_to_month(self, target_month_name, target_year):
@@ -75,11 +333,12 @@ class TourvisorSearchTest:
             try:
                 month_el = self.driver.find_element(By.XPATH, "//div[contains(@class, 'TVCalendarTitleControlMonth')]")
                 year_el = self.driver.find_element(By.XPATH, "//div[contains(@class, 'TVCalendarTitleControlYear')]")
-                if month_el.text.strip().upper() == target_month_name.upper() and year_el.text.strip() == str(target_year):
+                month_text = month_el.text.strip()
+                if month_text.upper() == target_month_name.upper() and year_el.text.strip() == str(target_year):
                     return True
                 next_btn = self.wait.until(EC.element_to_be_clickable((By.XPATH, "//div[contains(@class, 'TVCalendarSliderViewRightButton') and not(contains(@class, 'TVDisabled'))]")))
-                self._safe_click(next_btn)
-                time.sleep(0.4)
+                self._safe_click(next_btn, "calendar:next")
+                self.waits.text_changed((By.XPATH, "//div[contains(@class, 'TVCalendarTitleControlMonth')]"), month_text, "calendar:month")
             except Exception as e:
                 if attempt == 0:
                     print(f"⚠️ Прокрутка: {e}")
@@ -90,6 +349,7 @@ class TourvisorSearchTest:
         element = self._wait_for_element(By.XPATH, f"//t-td[@data-value='{day}' and not(contains(@class, 'TVCalendarDisabledCell'))]")
         self._safe_click(element)
 
+    @traced("select_departure_dates")
     def _select_departure_dates(self, dep_str, ret_str=None):
         field = self._wait_for_element(By.CSS_SELECTOR, "div.TVFlyDatesFilter")
         self._safe_click(field)
@@ -97,13 +357,13 @@ class TourvisorSearchTest:
         dep_date = datetime.strptime(dep_str, "%d.%m.%Y")
         self._scroll_to_month(self.MONTHS_RU[dep_date.month], dep_date.year)
         self._click_calendar_day(dep_date)
-        time.sleep(0.5)
+        self.waits.dom_quiet("div.TVFlyDatesSelectTooltip", "calendar:departure")
         if ret_str:
             ret_date = datetime.strptime(ret_str, "%d.%m.%Y")
             if dep_date.month != ret_date.month or dep_date.year != ret_date.year:
                 self._scroll_to_month(self.MONTHS_RU[ret_date.month], ret_date.year)
             self._click_calendar_day(ret_date)
-            time.sleep(0.3)
+            self.waits.dom_quiet("div.TVFlyDatesSelectTooltip", "calendar:return")
         try:
             self.driver.execute_script("document.elementFromPoint(10, 10).click();")
         except:
@@ -112,6 +372,7 @@ class TourvisorSearchTest:
             except:
                 pass
 
+    @traced("select_nights")
     def _select_nights(self, nights_range):
         field = self._wait_for_element(By.XPATH, "//div[contains(@class, 'TVNightsFilter')]")
         self._safe_click(field)
@@ -122,6 +383,7 @@ class TourvisorSearchTest:
         max_cell = self._wait_for_element(By.XPATH, f"//div[contains(@class, 'TVRangeTableCell') and .//div[contains(@class, 'TVRangeCellLabel') and text()='{max_night}']]")
         self._safe_click(max_cell)
 
+    @traced("select_tourists")
     def _select_tourists(self, tourists_str):
         field = self._wait_for_element(By.CSS_SELECTOR, "div.TVTouristsFilter")
         self._safe_click(field)
@@ -131,7 +393,7 @@ class TourvisorSearchTest:
             raise ValueError(f"Не удалось извлечь число туристов из: {tourists_str}")
         target_count = int(match.group(1))
         current = self.driver.find_element(By.XPATH, "//div[contains(@class, 'TVTouristCount') and contains(@class, 'TVTouristAll')]")
-        current_count = int(re.search(r'\d+', current.text).group())
+        current_count = self._tourist_count(current)
         plus_btn = self._wait_for_element(By.XPATH, "//div[contains(@class, 'TVTouristActionPlus')]")
         minus_btn = self._wait_for_element(By.XPATH, "//div[contains(@class, 'TVTouristActionMinus')]")
         select_btn = self._wait_for_element(By.XPATH, "//div[contains(@class, 'TVButtonControl') and contains(text(), 'Выбрать')]")
@@ -139,87 +401,95 @@ class TourvisorSearchTest:
             btn = plus_btn if current_count < target_count else minus_btn
             self._safe_click(btn)
             current_count += 1 if current_count < target_count else -1
-            time.sleep(0.2)
+            self.waits.until(lambda d: self._tourist_count(current) == current_count, "tourists:count")
         self._safe_click(select_btn)
         expected = f"{target_count} взрослых"
         self.wait.until(EC.text_to_be_present_in_element((By.CSS_SELECTOR, "div.TVTouristsFilter"), expected))
 
-    def _select_operators(self, operators_config):
+    def _tourist_count(self, element):
+        try:
+            return int(re.search(r'\d+', element.text).group())
+        except (StaleElementReferenceException, AttributeError):
+            return None
+
+    @traced("select_operators")
+    def _select_operators(self, names):
         self.selected_operators = []
-        if not operators_config or not any(operators_config.values()):
+        if not names:
             return
         field = self._wait_for_element(By.CSS_SELECTOR, "div.TVOperatorListFilter")
         self.driver.execute_script("arguments[0].click();", field)
-        time.sleep(1.5)
         self._wait_for_element(By.CLASS_NAME, "TVOperatorsList")
-        mapping = {
-            'anex': 'Anex',
-            'biblioglobus': 'Biblioglobus',
-            'funsun': 'FUN&SUN (TUI)',
-            'travelata': 'Travelata',
-            'coral': 'Coral',
-            'sunmar': 'Sunmar',
-            'pegas': 'Pegas Touristik'
-        }
-        for key, flag in operators_config.items():
-            if flag and key in mapping:
-                name = mapping[key]
-                try:
-                    el = self.driver.find_element(By.XPATH, f"//div[contains(@class, 'TVCheckBox') and contains(text(), '{name}') and not(contains(@class, 'TVDisabled'))]")
-                    if "TVChecked" not in el.get_attribute("class"):
-                        self.driver.execute_script("arguments[0].click();", el)
-                        time.sleep(0.4)
-                    self.selected_operators.append(name)
-                except Exception as e:
-                    print(f"⚠️ Не удалось выбрать {name}: {e}")
+        self.waits.dom_quiet(".TVOperatorsList", "operators:list")
+        for name in names:
+            try:
+                el = self.driver.find_element(By.XPATH, f"//div[contains(@class, 'TVCheckBox') and contains(text(), '{name}') and not(contains(@class, 'TVDisabled'))]")
+                if "TVChecked" not in el.get_attribute("class"):
+                    self.driver.execute_script("arguments[0].click();", el)
+                    self.waits.class_contains(el, "TVChecked", f"operators:{name}")
+                self.selected_operators.append(name)
+            except Exception as e:
+                print(f"⚠️ Не удалось выбрать {name}: {e}")
 
+    @traced("toggle_charter_checkbox")
     def _toggle_charter_checkbox(self, value):
         checkbox = self._wait_for_element(By.XPATH, "//div[contains(@class, 'TVCheckboxControl') and .//div[contains(text(), 'Только чартер')]]")
         is_checked = "TVChecked" in checkbox.get_attribute("class")
         if (value == 1 and not is_checked) or (value == 0 and is_checked):
             self._safe_click(checkbox)
 
+    @traced("search")
     def click_search_button(self):
         btn = self._wait_for_element(By.XPATH, "//div[contains(@class, 'TVSearchButton') and contains(text(), 'Найти туры')]")
         self._safe_click(btn)
 
+    def _push_partial(self):
+        partial = bulk_tourvisor_operators(self.driver)
+        if partial:
+            self.stream.push(partial)
+
     def _wait_for_search_completion(self):
-        start = time.time()
-        while time.time() - start < 120:
-            try:
-                bars = self.driver.find_elements(By.XPATH, "//div[contains(@class, 'TVProgressBar')]")
-                visible = any(b.is_displayed() for b in bars if not b.find_elements(By.XPATH, "..//div[contains(@class, 'TVResultToolbar')]"))
-                if not visible and not self.driver.find_elements(By.XPATH, "//div[contains(@class, 'TVResultToolbarProgress') and @style]"):
-                    return True
-                if time.time() - start > 30 and self.driver.find_elements(By.CSS_SELECTOR, ".TVResultItem"):
-                    return True
-                time.sleep(1.5)
-            except:
-                time.sleep(1.5)
-        return True
+        timeout = self.completion.timeout_for("tourvisor", self.test_data)
+        with self.tracer.span("wait") as span:
+            self.completion_info = wait_for_completion(
+                self.driver, "tourvisor", timeout, self.completion.stable_window("tourvisor"),
+                self.completion.poll, self._push_partial if self.stream else None, self.stale,
+            )
+            span["reason"] = self.completion_info["reason"]
+        print(f"⏹️ Ожидание выдачи завершено: {self.completion_info['reason']} ({self.completion_info['seconds']:.1f} сек)")
+        # stale — на странице осталась выдача прошлого поиска
+        return self.completion_info["reason"] != "stale"
 
     def _get_all_operators_with_prices(self):
         ops = []
         try:
             btn = self.driver.find_element(By.XPATH, "//div[contains(@class, 'TVResultToolbarOperators')]")
-            self._safe_click(btn)
-            time.sleep(1)
-            items = self.driver.find_element(By.CLASS_NAME, "TVOperatorFilterColumnBody").find_elements(By.CSS_SELECTOR, ".TVOperatorFilterItemControl")
-            for item in items:
-                try:
-                    name = item.find_element(By.CSS_SELECTOR, ".TVCheckBox").text.strip()
-                    price = item.find_element(By.CSS_SELECTOR, ".TVOperatorFilterItemPriceValue").text.strip()
-                    currency = item.find_element(By.CSS_SELECTOR, ".TVOperatorFilterItemPriceCurrency").text.strip()
-                    if name and price:
-                        ops.append({'name': name, 'price': f"{price} {currency}"})
-                except:
-                    continue
+            self._safe_click(btn, "results:operators")
+            self.waits.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".TVOperatorFilterColumnBody .TVOperatorFilterItemControl")), "results:operators")
+            self.waits.dom_quiet(".TVOperatorFilterColumnBody", "results:prices")
+            ops = bulk_tourvisor_operators(self.driver)
+            if ops is None:
+                ops = self._collect_operators_per_element()
             self.driver.execute_script("document.elementFromPoint(100,100).click();")
-            time.sleep(0.3)
         except:
             pass
+        return ops or []
+
+    def _collect_operators_per_element(self):
+        ops = []
+        items = self.driver.find_element(By.CLASS_NAME, "TVOperatorFilterColumnBody").find_elements(By.CSS_SELECTOR, ".TVOperatorFilterItemControl")
+        for item in items:
+            try:
+                name = item.find_element(By.CSS_SELECTOR, ".TVCheckBox").text.strip()
+                price = item.find_element(By.CSS_SELECTOR, ".TVOperatorFilterItemPriceValue").text.strip()
+                currency = item.find_element(By.CSS_SELECTOR, ".TVOperatorFilterItemPriceCurrency").text.strip()
+                if name and price:
+                    ops.append(make_operator(name, price, currency))
+            except:
+                continue
         return ops
 
+    @traced("extract")
     def _extract_first_tour_info(self):
         tours = self.driver.find_elements(By.CSS_SELECTOR, ".TVResultItem")
         if not tours:
@@ -229,68 +499,166 @@ class TourvisorSearchTest:
         return True
 
     def verify_search_results(self):
+        if self.network and self.network.enabled:
+            timeout = self.completion.timeout_for("tourvisor", self.test_data)
+            with self.tracer.span("wait") as span:
+                ops = self.network.wait(timeout=timeout)
+                span["reason"] = "network" if ops is not None else "timeout"
+            self.completion_info = {"reason": span["reason"], "seconds": span["seconds"], "timeout": timeout, "items": len(ops or [])}
+            if ops is not None:
+                self.all_operators_with_prices = ops
+                return bool(ops) or bool(self.driver.find_elements(By.CSS_SELECTOR, ".TVResultItem"))
         return self._wait_for_search_completion() and self._extract_first_tour_info()
 
+    @traced("deep_link")
+    def _open_deep_link(self, test_data):
+        url, reason = build_url("tourvisor", test_data, f"{self.URL}#!/?{{query}}")
+        if not url:
+            print(f"⚠️ Глубокая ссылка невозможна: {reason}")
+            return False
+        if self.network:
+            self.network.reset()
+        self.driver.get(url)
+
+        def started(driver):
+            if self._link_mismatches(test_data):
+                return False
+            return any(e.is_displayed() for e in driver.find_elements(By.CSS_SELECTOR, ".TVProgressBar, .TVResultItem"))
+        try:
+            WebDriverWait(self.driver, 10, poll_frequency=0.25, ignored_exceptions=(StaleElementReferenceException,)).until(started)
+            return True
+        except TimeoutException:
+            wrong = self._link_mismatches(test_data)
+            print(f"⚠️ Сайт не принял параметры из ссылки ({', '.join(wrong) or 'поиск не начался'}) — заполняем форму")
+            return False
+
+    def _link_mismatches(self, test_data):
+        # Непонятый параметр сайт молча заменяет своим значением — сверяем подписи всех полей из ссылки
+        checks = {
+            "departure_city": lambda: test_data["departure_city"] in _label(self.driver, "div.TVDepartureFilter"),
+            "destination_country": lambda: test_data["destination_country"] in _label(self.driver, "div.TVCountryFilter"),
+            "departure_dates": lambda: all(_shows_date(_label(self.driver, "div.TVFlyDatesFilter"), v) for v in test_data["departure_dates"] if v),
+            "nights": lambda: _shows_nights(_label(self.driver, "div.TVNightsFilter"), test_data["nights"]),
+            "tourists": lambda: _numbers(_label(self.driver, "div.TVTouristsFilter"))[:1] == [_adults(test_data["tourists"])],
+            "charter": lambda: test_data.get("charter", 1) not in (0, 1) or self._charter_checked() == (test_data.get("charter", 1) == 1),
+        }
+        return [field for field, ok in checks.items() if not ok()]
+
+    def _charter_checked(self):
+        found = self.driver.find_elements(By.XPATH, "//div[contains(@class, 'TVCheckboxControl') and .//div[contains(text(), 'Только чартер')]]")
+        return bool(found) and "TVChecked" in (found[0].get_attribute("class") or "")
+
     def fill_search_form(self, **data):
-        self._select_departure_city(data["departure_city"])
-        self._select_destination_country(data["destination_country"])
-        self._select_departure_dates(data["departure_dates"][0], data["departure_dates"][1])
-        self._select_nights(data["nights"])
-        self._select_tourists(data["tourists"])
-        self._select_operators(data.get("operators", {}))
-        self._toggle_charter_checkbox(data.get("charter", 1))
-
-    def run_test(self, test_data):
+        for _, step in self.form_steps(data):
+            step()
+
+    def _inject_form(self, test_data, fields=None):
+        super()._inject_form(test_data, fields)
+        for r in self.form_fill:
+            if r["field"] == "operators" and r["ok"]:
+                self.selected_operators = r["picked"]
+
+    def _submit_search(self):
+        if self.network:
+            self.network.reset()
+        self._remember_results()
+        self.click_search_button()
+
+    def run_test(self, test_data, on_update=None):
+        self.test_data = test_data
         print("\n🚀 ЗАПУСК ТЕСТА TOURVISOR\n" + "=" * 40)
+        self.tracer = Tracer()
+        self.completion_info = None
+        self.stale = None
+        self.error = None
+        self.pipeline = None
+        self.form_fill = None
+        self.injected = set()
+        self.stream = OperatorStream(on_update, "tourvisor") if on_update else None
         success = False
         search_start = None
-        result_operators = []
         try:
             self.setup()
-            self.open_tourvisor()
-            self.fill_search_form(**test_data)
-            self.click_search_button()
+            if not (self.deep_link and self._open_deep_link(test_data)):
+                self._run_pipeline(test_data)
             search_start = time.time()  # ✅ Время отсчитывается отсюда
             success = self.verify_search_results()
         except Exception as e:
             print(f"\n💥 Ошибка Tourvisor: {e}")
+            self.error = f"{type(e).__name__}: {e}"
         finally:
             duration = time.time() - (search_start or time.time())
             status = "🎉 УСПЕХ" if success else "💥 ПРОВАЛ"
             print(f"\n{status} — Tourvisor — {duration:.1f} сек")
-            if success and (not self.selected_operators or len(self.selected_operators) >= 2):
-                result_operators = [
-                    {"name": op["name"], "price": op["price"]}
-                    for op in self.all_operators_with_prices
-                ]
-            if self.driver:
-                self.driver.quit()
-        return {"success": success, "duration": duration, "operators": result_operators}
-
-
-class SletatSearchTest:
-    def __init__(self):
-        self.driver = None
-        self.wait = None
-        self.test_data = None
+            self.teardown()
+            result = self.build_result(success, duration)
+        return result
+
+    def build_result(self, success, duration):
+        result_operators = []
+        if success and (not self.selected_operators or len(self.selected_operators) >= 2):
+            result_operators = [
+                {"name": op["name"], "price": op["price"], "amount": op["amount"], "currency": op["currency"]}
+                for op in self.all_operators_with_prices
+            ]
+        METRICS.observe("tourvisor", self.tracer.spans)
+        if self.stream:
+            self.stream.complete(result_operators, success)
+        return {"success": success, "duration": duration, "operators": result_operators, "waits": self.waits.report() if self.waits else [], "spans": self.tracer.export(), "completion": self.completion_info, "steps": self.pipeline.report() if self.pipeline else None, "form_fill": self.form_fill, "error": self.error}
 
-    def setup(self):
-        options = webdriver.ChromeOptions()
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        self.driver = webdriver.Chrome(options=options)
-        self.driver.maximize_window()
-        self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        self.wait = WebDriverWait(self.driver, 20)
 
+class SletatSearchTest(SearchTestBase):
+    SITE = "sletat"
+    WAIT_TIMEOUT = 20
+    URL = "https://sletat.ru/b2b/"
+    FORM_STEPS = [
+        ("departure_city", "_select_departure_city", lambda d: (d["departure_city"], _ref(d, "departure_city"))),
+        ("destination_country", "_select_destination_country", lambda d: (d["destination_country"], _ref(d, "destination_country"))),
+        ("departure_dates", "_select_departure_dates", lambda d: tuple(d["departure_dates"])),
+        ("nights", "_select_nights_js", lambda d: (d["nights"],)),
+        ("tourists", "_select_tourists", lambda d: (d["tourists"],)),
+        ("operators", "_select_operators", lambda d: (_operator_names(d),)),
+        ("charter", "_toggle_charter", lambda d: (d.get("charter", False),)),
+    ]
+    FORM_SPEC = [
+        ("departure_city", "type_pick", {"trigger": "input.excludeClickOutside", "option": "div.city-selector-list ul li button"},
+         lambda d: d["departure_city"]),
+        ("destination_country", "pick", {
+            "trigger": "#ui-select-country-to", "option": "div.uis-select__options_country-to li.uis-select__options-item",
+            "match": "span.slsf-country-to__select-text",
+        }, lambda d: d["destination_country"]),
+        ("departure_dates", "calendar", {
+            "trigger": "div.containerTitle", "title": [".rdrMonthName"],
+            "next": "button.navigatorSlideButton.nextButton", "prev": "button.navigatorSlideButton:not(.nextButton)",
+            "cell": "button.rdrDay:not(.rdrDayDisabled)", "day_text": "span.customDay > span:first-child",
+            "confirm": "button.date-range-date-label",
+        }, lambda d: [_date_parts(v) for v in d["departure_dates"]]),
+        ("nights", "inputs", {}, lambda d: [list(p) for p in zip(("#ui-select-nightsMin", "#ui-select-nightsMax"), _nights_pair(d["nights"]))]),
+        ("tourists", "counter", {
+            "trigger": "#touristSelector .tourist-current-select", "count": "#touristSelector .tourist-current-select",
+            "plus": ["button.adult-counter-btn", "+"],
+        }, lambda d: d["tourists"] if isinstance(d["tourists"], int) else None),
+        ("operators", "checkboxes", {
+            "trigger": ".uis-text_tour-operator", "clear_all": ".slsf-tour-operator__selected-block input",
+            "search": ".uis-text_tour-operator", "item": "label.tour-operator", "match": "span.slsf-text-bold", "exact": True,
+        }, lambda d: _operator_names(d) or None),
+        ("charter", "toggle", {"item": "label.uis-checkbox__label_flight-info", "enable_only": True},
+         lambda d: [{"text": "Чартерные", "on": bool(d.get("charter", False))}, {"text": "Прямые", "on": bool(d.get("direct", False))}]),
+    ]
+
+    @traced("open_sletat")
     def open_sletat(self):
-        self.driver.get("https://sletat.ru/b2b/")
-        closeAD = WebDriverWait(self.driver, 3).until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".icon-remove")),message="Кнопка не найдена")
-        closeAD.click()
+        self.driver.get(self.URL)
+        try:
+            closeAD = WebDriverWait(self.driver, 3).until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".icon-remove")),message="Кнопка не найдена")
+            closeAD.click()
+        except TimeoutException:
+            # С заблокированными трекерами баннер может не появиться вовсе
+            if not self.lean:
+                raise
         self._close_cookies()
+        if self.lean:
+            check_widgets(self.driver, "sletat")
 
     def _close_cookies(self):
         try:
@@ -299,24 +667,35 @@ class SletatSearchTest:
         except:
             pass
 
-    def _select_departure_city(self, city: str):
+    @traced("select_departure_city")
+    def _select_departure_city(self, city: str, ref=None):
         field = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "input.excludeClickOutside")))
         field.click()
         field.clear()
         field.send_keys(city)
-        time.sleep(0.5)
+        option = ref_option(self.driver, option_selector("div.city-selector-list ul li button", ref), city)
+        if option is not None:
+            option.click()
+            return True
         city_list = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.city-selector-list")))
+        self.waits.dom_quiet(city_list, "city:list")
         for option in city_list.find_elements(By.CSS_SELECTOR, "ul li button"):
             if city.lower() in option.text.strip().lower():
                 option.click()
                 return True
         raise Exception(f"Город '{city}' не найден")
 
-    def _select_destination_country(self, country: str):
+    @traced("select_destination_country")
+    def _select_destination_country(self, country: str, ref=None):
         field = self.wait.until(EC.element_to_be_clickable((By.ID, "ui-select-country-to")))
         field.click()
-        time.sleep(0.5)
+        option = ref_option(self.driver, option_selector("div.uis-select__options_country-to li.uis-select__options-item", ref),
+                            country, "span.slsf-country-to__select-text")
+        if option is not None:
+            option.click()
+            return True
         country_list = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.uis-select__options_country-to")))
+        self.waits.dom_quiet(country_list, "country:list")
         for option in country_list.find_elements(By.CSS_SELECTOR, "li.uis-select__options-item"):
             try:
                 span = option.find_element(By.CSS_SELECTOR, "span.slsf-country-to__select-text")
@@ -327,11 +706,11 @@ class SletatSearchTest:
                 continue
         raise Exception(f"Страна '{country}' не найдена")
 
+    @traced("select_departure_dates")
     def _select_departure_dates(self, dep: str, ret: str):
         container = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "div.containerTitle")))
         container.click()
-        time.sleep(0.5)
-        self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "button.rdrDay")))
+        self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button.rdrDay")))
         self._navigate_to_date(dep)
         if not self._select_single_date(dep): raise Exception("Дата вылета не выбрана")
         if not self._select_single_date(ret): raise Exception("Дата возврата не выбрана")
@@ -344,11 +723,12 @@ class SletatSearchTest:
         cur_month, cur_year = self._parse_month_year(self._get_current_month_year())
         diff = (target_year - cur_year) * 12 + (target_month - cur_month)
         for _ in range(abs(diff)):
+            before = self._get_current_month_year()
             if diff > 0:
                 self._click_next_month()
             else:
                 self._click_prev_month()
-            time.sleep(0.3)
+            self.waits.text_changed((By.CSS_SELECTOR, ".rdrMonthName"), before, "calendar:month")
 
     def _get_current_month_year(self):
         try:
@@ -382,6 +762,7 @@ class SletatSearchTest:
                 continue
         return False
 
+    @traced("select_nights")
     def _select_nights_js(self, nights_range: str):
         mn, mx = map(int, nights_range.split("-"))
         self.driver.execute_script(f"""
@@ -392,8 +773,12 @@ class SletatSearchTest:
                 [min, max].forEach(e => e.dispatchEvent(new Event('input')));
             }}
         """)
-        time.sleep(0.5)
+        self.waits.until(
+            lambda d: d.execute_script("const e = document.getElementById('ui-select-nightsMax'); return !e || e.value === arguments[0];", str(mx)),
+            "nights",
+        )
 
+    @traced("select_tourists")
     def _select_tourists(self, count: int):
         container = self.wait.until(EC.presence_of_element_located((By.ID, "touristSelector")))
         current = container.find_element(By.CLASS_NAME, "tourist-current-select")
@@ -403,11 +788,11 @@ class SletatSearchTest:
         while cur < count:
             self.driver.execute_script("arguments[0].click();", plus)
             cur += 1
-            time.sleep(0.2)
+            self.waits.text_contains(current, str(cur), "tourists:count", timeout=1)
         self.driver.execute_script("arguments[0].click();", current)
 
-    def _select_operators(self, op_dict):
-        ops_to_select = [name for name, flag in op_dict.items() if flag == 1]
+    @traced("select_operators")
+    def _select_operators(self, ops_to_select):
         if not ops_to_select:
             return
         sf = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".uis-text_tour-operator")))
@@ -416,7 +801,7 @@ class SletatSearchTest:
             all_checkbox = self.driver.find_element(By.CSS_SELECTOR, ".slsf-tour-operator__selected-block input")
             if self.driver.execute_script("return arguments[0].checked;", all_checkbox):
                 self.driver.execute_script("arguments[0].click();", all_checkbox)
-                time.sleep(0.4)
+                self.waits.checked(all_checkbox, "operators:all", value=False)
         except:
             pass
         def select_op(name):
@@ -425,20 +810,21 @@ class SletatSearchTest:
                 sf_el.clear()
                 self.driver.execute_script("arguments[0].value = '';", sf_el)
                 sf_el.click()
-                time.sleep(0.2)
                 sf_el.send_keys(name)
-                time.sleep(0.5)
-                label = self.driver.find_element(By.XPATH, f"//label[contains(@class, 'tour-operator') and .//span[@class='slsf-text-bold' and normalize-space(text())='{name}']]")
+                label = self.waits.until(EC.presence_of_element_located((By.XPATH, f"//label[contains(@class, 'tour-operator') and .//span[@class='slsf-text-bold' and normalize-space(text())='{name}']]")), f"operators:{name}")
+                if not label:
+                    raise Exception("нет в списке операторов")
                 self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", label)
                 checkbox = label.find_element(By.TAG_NAME, "input")
                 if not self.driver.execute_script("return arguments[0].checked;", checkbox):
                     self.driver.execute_script("arguments[0].click();", label)
+                    self.waits.checked(checkbox, f"operators:{name}:checked")
             except Exception as e:
                 print(f"⚠️ {name}: {e}")
         for op in ops_to_select:
             select_op(op)
-            time.sleep(0.2)
 
+    @traced("toggle_charter")
     def _toggle_charter(self, enable_charter):
         def set_flag(label_text, enable):
             if not enable: return
@@ -452,77 +838,163 @@ class SletatSearchTest:
         set_flag("Чартерные", bool(enable_charter))
         set_flag("Прямые", bool(self.test_data.get("direct", False)))
 
+    @traced("search")
     def _click_search_button(self):
         self.driver.execute_script("""
             const btn = document.querySelector('[data-testid="b2b.search-form.search-btn"]');
             if (btn) btn.click();
         """)
 
+    def _wait_for_results(self):
+        if self.network and self.network.enabled:
+            timeout = self.completion.timeout_for("sletat", self.test_data)
+            with self.tracer.span("wait") as span:
+                ops = self.network.wait(timeout=timeout)
+                span["reason"] = "network" if ops is not None else "timeout"
+            self.completion_info = {"reason": span["reason"], "seconds": span["seconds"], "timeout": timeout, "items": len(ops or [])}
+            if ops is not None:
+                return ops
+        return self._parse_results_after_search()
+
     def _parse_results_after_search(self):
+        if not self._wait_for_result_status():
+            return []
         try:
-            WebDriverWait(self.driver, 3).until(EC.presence_of_element_located((By.CLASS_NAME, "tour-not-found-message")))
+            return self._extract_operators()
+        except:
             return []
+
+    def _push_partial(self):
+        partial = bulk_sletat_operators(self.driver)
+        if partial:
+            self.stream.push(partial)
+
+    def _wait_for_result_status(self):
+        timeout = self.completion.timeout_for("sletat", self.test_data)
+        with self.tracer.span("wait") as span:
+            self.completion_info = wait_for_completion(
+                self.driver, "sletat", timeout, self.completion.stable_window("sletat"),
+                self.completion.poll, self._push_partial if self.stream else None, self.stale,
+            )
+            span["reason"] = self.completion_info["reason"]
+        print(f"⏹️ Ожидание выдачи завершено: {self.completion_info['reason']} ({self.completion_info['seconds']:.1f} сек)")
+        # По таймауту всё равно забираем то, что успело загрузиться
+        return self.completion_info["reason"] not in ("empty", "stale")
+
+    @traced("extract")
+    def _extract_operators(self):
+        try:
+            btn = self.driver.find_element(By.CSS_SELECTOR, ".blinchik__hide-button.blinchik__hide-button_closed")
+            self.driver.execute_script("arguments[0].click();", btn)
+            self.waits.dom_quiet(".blinchik__operator-container", "results:expand")
         except:
             pass
+        ops = bulk_sletat_operators(self.driver)
+        if ops is None:
+            ops = self._collect_operators_per_element()
+        return ops
+
+    def _collect_operators_per_element(self):
+        ops = []
         try:
-            status_div = WebDriverWait(self.driver, 90).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.search-status__tours-count")))
-            count_span = status_div.find_element(By.CSS_SELECTOR, "span.search-status__text-bold:first-child")
-            total_tours = int(count_span.text.replace(" ", ""))
-            try:
-                btn = self.driver.find_element(By.CSS_SELECTOR, ".blinchik__hide-button.blinchik__hide-button_closed")
-                self.driver.execute_script("arguments[0].click();", btn)
-                time.sleep(0.4)
-            except:
-                pass
-            ops = []
-            try:
-                container = self.driver.find_element(By.CSS_SELECTOR, ".blinchik__operator-container")
-                for item in container.find_elements(By.CSS_SELECTOR, "li.blinchik__operator-item"):
-                    try:
-                        label = item.find_element(By.CSS_SELECTOR, "label")
-                        name = self.driver.execute_script("return (arguments[0].childNodes[0].textContent || '').trim();", label)
-                        disabled = "uis-checkbox__label_disabled" in label.get_attribute("class")
-                        price_el = item.find_elements(By.CSS_SELECTOR, ".blinchik__price .sr-currency-rub")
-                        if price_el and not disabled:
-                            price = int(price_el[0].text.replace(" ", ""))
-                            ops.append({"name": name, "price": f"{price} ₽"})
-                    except:
-                        continue
-            except:
-                pass
-            return ops
+            container = self.driver.find_element(By.CSS_SELECTOR, ".blinchik__operator-container")
+            for item in container.find_elements(By.CSS_SELECTOR, "li.blinchik__operator-item"):
+                try:
+                    label = item.find_element(By.CSS_SELECTOR, "label")
+                    name = self.driver.execute_script("return (arguments[0].childNodes[0].textContent || '').trim();", label)
+                    disabled = "uis-checkbox__label_disabled" in label.get_attribute("class")
+                    price_el = item.find_elements(By.CSS_SELECTOR, ".blinchik__price .sr-currency-rub")
+                    if price_el and not disabled:
+                        price = int(price_el[0].text.replace(" ", ""))
+                        ops.append({"name": name, "price": f"{price} ₽", "amount": price, "currency": "RUB"})
+                except:
+                    continue
         except:
-            return []
+            pass
+        return ops
+
+    def _submit_search(self):
+        if self.network:
+            self.network.reset()
+        self._remember_results()
+        self._click_search_button()
+
+    @traced("deep_link")
+    def _open_deep_link(self, test_data):
+        url, reason = build_url("sletat", test_data, f"{self.URL}?{{query}}")
+        if not url:
+            print(f"⚠️ Глубокая ссылка невозможна: {reason}")
+            return False
+        self.driver.get(url)
+        try:
+            WebDriverWait(self.driver, 3).until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".icon-remove"))).click()
+        except TimeoutException:
+            pass
+        self._close_cookies()
+        try:
+            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input.excludeClickOutside")))
+        except Exception:
+            return False
+        try:
+            WebDriverWait(self.driver, 5, poll_frequency=0.25, ignored_exceptions=(StaleElementReferenceException,)).until(
+                lambda d: not self._link_mismatches(test_data))
+        except TimeoutException:
+            print(f"⚠️ Сайт не принял параметры из ссылки ({', '.join(self._link_mismatches(test_data))}) — заполняем форму")
+            return False
+        self._submit_search()
+        return True
+
+    def _link_mismatches(self, test_data):
+        nights = _nights_pair(test_data["nights"])
+        checks = {
+            "departure_city": lambda: test_data["departure_city"].lower() in _label(self.driver, "input.excludeClickOutside", "value").lower(),
+            "destination_country": lambda: test_data["destination_country"].lower() in _label(self.driver, "#ui-select-country-to").lower(),
+            "departure_dates": lambda: all(_shows_date(_label(self.driver, "div.containerTitle"), v) for v in test_data["departure_dates"]),
+            "nights": lambda: [_label(self.driver, sel, "value") for sel in ("#ui-select-nightsMin", "#ui-select-nightsMax")] == [str(n) for n in nights],
+            "tourists": lambda: _numbers(_label(self.driver, "#touristSelector .tourist-current-select"))[:1] == [test_data["tourists"]],
+            "charter": lambda: all(self._flag_checked(text) for text, on in (("Чартерные", test_data.get("charter")), ("Прямые", test_data.get("direct"))) if on),
+        }
+        return [field for field, ok in checks.items() if not ok()]
+
+    def _flag_checked(self, label_text):
+        found = self.driver.find_elements(By.XPATH, f"//label[contains(@class, 'uis-checkbox__label_flight-info') and contains(., '{label_text}')]//input")
+        return bool(found) and bool(self.driver.execute_script("return arguments[0].checked;", found[0]))
 
-    def run_test(self, test_data):
+    def run_test(self, test_data, on_update=None):
         self.test_data = test_data
         print("\n🚀 ЗАПУСК ТЕСТА SLETAT\n" + "=" * 40)
+        self.tracer = Tracer()
+        self.completion_info = None
+        self.stale = None
+        self.error = None
+        self.pipeline = None
+        self.form_fill = None
+        self.injected = set()
+        self.stream = OperatorStream(on_update, "sletat") if on_update else None
         result_operators = []
         search_start = None
         try:
             self.setup()
-            self.open_sletat()
-            self._select_departure_city(test_data["departure_city"])
-            self._select_destination_country(test_data["destination_country"])
-            self._select_departure_dates(*test_data["departure_dates"])
-            self._select_nights_js(test_data["nights"])
-            self._select_tourists(test_data["tourists"])
-            ops = test_data["operators"]
-            if any(ops.values()):
-                self._select_operators(ops)
-            self._toggle_charter(test_data.get("charter", False))
-            self._click_search_button()
+            if not (self.deep_link and self._open_deep_link(test_data)):
+                self._run_pipeline(test_data)
             search_start = time.time()
-            result_operators = self._parse_results_after_search()
+            result_operators = self._wait_for_results()
         except Exception as e:
             print(f"\n💥 Ошибка Sletat: {e}")
+            self.error = f"{type(e).__name__}: {e}"
         finally:
             duration = time.time() - (search_start or time.time())
             status = "🎉 УСПЕХ" if result_operators else "⚠️ НЕТ ТУРОВ"
             print(f"\n{status} — Sletat — {duration:.1f} сек")
-            if self.driver:
-                self.driver.quit()
-        return {"success": bool(result_operators), "duration": duration, "operators": result_operators}
+            self.teardown()
+            result = self.build_result(result_operators, duration)
+        return result
+
+    def build_result(self, result_operators, duration):
+        METRICS.observe("sletat", self.tracer.spans)
+        if self.stream:
+            self.stream.complete(result_operators, bool(result_operators))
+        return {"success": bool(result_operators), "duration": duration, "operators": result_operators, "waits": self.waits.report() if self.waits else [], "spans": self.tracer.export(), "completion": self.completion_info, "steps": self.pipeline.report() if self.pipeline else None, "form_fill": self.form_fill, "error": self.error}
 
 
 test_data = {
@@ -537,20 +1009,57 @@ test_data = {
 }
 
 
-def run_tourvisor(test_data):
+def _apply_catalog(data, site, catalog):
+    # Названия — в написании сайта, ID опций — для выбора одним селектором
+    refs = catalog.resolve(site, data)
+    for field in ("departure_city", "destination_country"):
+        if field in refs:
+            data[field] = refs[field]["name"]
+    data["refs"] = refs
+    return data
+
+def prepare_tourvisor_data(test_data, catalog=None):
     data = test_data.copy()
     if data["departure_city"] == "Санкт-Петербург":
         data["departure_city"] = "С.Петербург"
     if isinstance(data["tourists"], int):
         data["tourists"] = f"{data['tourists']} взрослых"
-    return TourvisorSearchTest().run_test(data)
+    return _apply_catalog(data, "tourvisor", catalog) if catalog else data
 
-def run_sletat(test_data):
+def prepare_sletat_data(test_data, catalog=None):
     data = test_data.copy()
     if isinstance(data["tourists"], str):
         match = re.search(r'^(\d+)', data["tourists"])
         data["tourists"] = int(match.group(1)) if match else 1
-    return SletatSearchTest().run_test(data)
+    return _apply_catalog(data, "sletat", catalog) if catalog else data
+
+def run_tourvisor(test_data, pool=None, capture=False, cache=None, lean=False, deep_link=False, history=None, inject=False, catalog=None, completion=None,
+                  policies=None, escalation=None):
+    if catalog:
+        # Неверный город или страна — ошибка до запуска браузера
+        catalog.validate("tourvisor", test_data)
+    completion = completion or (policy_for(history) if history else None)
+
+    def run():
+        result = TourvisorSearchTest(pool, capture, lean, deep_link, completion, inject, policies, escalation).run_test(prepare_tourvisor_data(test_data, catalog))
+        # Пишем каждый настоящий поиск, в том числе фоновое обновление кэша; ответы из кэша в историю не попадают
+        if history:
+            history.record("tourvisor", test_data, result)
+        return result
+    return cache.get_or_run("tourvisor", test_data, run) if cache else run()
+
+def run_sletat(test_data, pool=None, capture=False, cache=None, lean=False, deep_link=False, history=None, inject=False, catalog=None, completion=None,
+               policies=None, escalation=None):
+    if catalog:
+        catalog.validate("sletat", test_data)
+    completion = completion or (policy_for(history) if history else None)
+
+    def run():
+        result = SletatSearchTest(pool, capture, lean, deep_link, completion, inject, policies, escalation).run_test(prepare_sletat_data(test_data, catalog))
+        if history:
+            history.record("sletat", test_data, result)
+        return result
+    return cache.get_or_run("sletat", test_data, run) if cache else run()
 
 
 if __name__ == "__main__":
@@ -598,4 +1107,14 @@ if __name__ == "__main__":
     else:
         print("\n❌ Tourvisor: операторов с турами не найдено")
 
+    if sl and tv:
+        from comparison import CrossSiteComparison
+        comparison = CrossSiteComparison([{"tourvisor": tv, "sletat": sl}])
+        deltas = comparison.deltas()[0]
+        common = [(name, delta) for name, delta, both in zip(comparison.operators, deltas, comparison.overlap[0]) if both]
+        if common:
+            print("\n⚖️ Разница Tourvisor − Sletat по общим операторам:")
+            for name, delta in common:
+                print(f"   • {name}: {delta:+,.0f}".replace(",", " "))
+
     print("\n🏁 Все тесты завершены.")
\ No newline at end of file
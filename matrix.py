@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from batch import default_browser_cap
+from session import SearchSession, PAGES
+from main import test_data as default_test_data
+
+
+DATE_FORMAT = "%d.%m.%Y"
+
+
+def date_range(start, end):
+    day = datetime.strptime(start, DATE_FORMAT)
+    last = datetime.strptime(end, DATE_FORMAT)
+    dates = []
+    while day <= last:
+        dates.append(day.strftime(DATE_FORMAT))
+        day += timedelta(days=1)
+    return dates
+
+
+def _cell_key(site, day, nights):
+    return f"{site}|{day}|{nights}"
+
+
+def cell_prices(result):
+    prices, currencies = {}, {}
+    for op in result["operators"]:
+        if op.get("amount") is None:
+            continue
+        if op["name"] not in prices or op["amount"] < prices[op["name"]]:
+            prices[op["name"]] = op["amount"]
+            currencies[op["name"]] = op.get("currency")
+    return prices, currencies
+
+
+class Checkpoint:
+    def __init__(self, path=None):
+        self.path = path
+        self.cells = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            line = ""
+            with open(path, encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Обход оборвали посреди записи — ячейка просто будет посчитана заново
+                        print(f"⚠️ {path}:{number}: повреждённая запись пропущена")
+                        continue
+                    self.cells[_cell_key(record["site"], record["date"], record["nights"])] = record
+            if line and not line.endswith("\n"):
+                # Иначе следующая ячейка допишется в хвост оборванной строки и тоже пропадёт
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("\n")
+
+    def done(self, site, day, nights, retry_failed=True):
+        record = self.cells.get(_cell_key(site, day, nights))
+        return record is not None and (record["success"] or not retry_failed)
+
+    def save(self, site, day, nights, result):
+        prices, currencies = cell_prices(result)
+        record = {
+            "site": site, "date": day, "nights": nights, "success": result["success"],
+            "duration": round(result["duration"], 3), "operators": prices, "currencies": currencies,
+        }
+        with self._lock:
+            self.cells[_cell_key(site, day, nights)] = record
+            if self.path:
+                # Каждая ячейка дописывается сразу — прерванный обход продолжится с того же места
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+
+def plan_chunks(dates, nights, sites, browsers):
+    # Внутри сайта ночи меняются реже дат: в соседних ячейках сессия перезаполняет только календарь
+    cells = {site: [(n, d) for n in nights for d in dates] for site in sites}
+    per_site = max(1, browsers // max(1, len(sites)))
+    chunks = []
+    for site, site_cells in cells.items():
+        size = -(-len(site_cells) // per_site) if site_cells else 0
+        for i in range(0, len(site_cells), size or 1):
+            chunks.append((site, site_cells[i:i + size]))
+    return chunks
+
+
+def _run_chunk(site, cells, base, checkpoint, stop, lean, on_cell):
+    with SearchSession(site, lean=lean) as session:
+        previous = None
+        for nights, day in cells:
+            if stop.is_set():
+                return
+            data = dict(base, departure_dates=(day, day), nights=nights)
+            result = session.run(data)
+            if previous and result["success"] and result["form"]["reused"] and cell_prices(result)[0] == previous:
+                # Цены один в один как у соседней ячейки — сайт мог не сменить выдачу.
+                # Повторяем поиск с чистой страницы: совпадёт снова — значит, цены и правда те же
+                print(f"🔍 {site} {day} {nights}: цены совпали с предыдущей ячейкой — перепроверяем с чистой страницы")
+                session.close()
+                result = session.run(data)
+            previous = cell_prices(result)[0] if result["success"] else None
+            record = checkpoint.save(site, day, nights, result)
+            if on_cell:
+                on_cell(record)
+
+
+def run_matrix(dates, nights, sites=tuple(PAGES), base=None, max_browsers=None, checkpoint=None,
+               retry_failed=True, lean=False, on_cell=None):
+    base = dict(base or default_test_data)
+    max_browsers = max_browsers or default_browser_cap()
+    checkpoint = checkpoint if isinstance(checkpoint, Checkpoint) else Checkpoint(checkpoint)
+    todo = [
+        (site, [(n, d) for n, d in cells if not checkpoint.done(site, d, n, retry_failed)])
+        for site, cells in plan_chunks(dates, nights, sites, max_browsers)
+    ]
+    todo = [(site, cells) for site, cells in todo if cells]
+    skipped = len(dates) * len(nights) * len(sites) - sum(len(cells) for _, cells in todo)
+    if skipped:
+        print(f"♻️ Из контрольной точки взято {skipped} ячеек")
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=max_browsers, thread_name_prefix="Matrix") as executor:
+        futures = [executor.submit(_run_chunk, site, cells, base, checkpoint, stop, lean, on_cell) for site, cells in todo]
+        try:
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"💥 Ошибка в серии ячеек: {e}")
+        except KeyboardInterrupt:
+            # Текущие поиски доигрываются и попадают в контрольную точку, новые не начинаются
+            stop.set()
+            raise
+    return build_matrix(checkpoint, dates, nights, sites)
+
+
+def build_matrix(checkpoint, dates, nights, sites=tuple(PAGES)):
+    records = [r for r in checkpoint.cells.values() if r["site"] in sites and r["date"] in dates and r["nights"] in nights]
+    operators = sorted({name for r in records for name in r["operators"]})
+    currencies = {}
+    for r in records:
+        currencies.update(r["currencies"])
+    prices, cheapest = {}, {}
+    missing = 0
+    for site in sites:
+        prices[site], cheapest[site] = [], []
+        for n in nights:
+            price_row, cheapest_row = [], []
+            for d in dates:
+                record = checkpoint.cells.get(_cell_key(site, d, n))
+                if record is None:
+                    missing += 1
+                cell = [record["operators"].get(op) if record else None for op in operators]
+                found = [p for p in cell if p is not None]
+                price_row.append(cell)
+                cheapest_row.append(min(found) if found else None)
+            prices[site].append(price_row)
+            cheapest[site].append(cheapest_row)
+    return {
+        "dates": list(dates), "nights": list(nights), "sites": list(sites), "operators": operators,
+        "currencies": currencies, "prices": prices, "cheapest": cheapest, "missing": missing,
+    }
+
+
+def print_matrix(matrix):
+    for site in matrix["sites"]:
+        print(f"\n📅 {site}: минимальная цена по дате вылета")
+        print(" " * 8 + "".join(f"{d[:5]:>10}" for d in matrix["dates"]))
+        for n, row in zip(matrix["nights"], matrix["cheapest"][site]):
+            print(f"{n:<8}" + "".join(f"{p:>10}" if p is not None else f"{'—':>10}" for p in row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Матрица цен: даты вылета × диапазоны ночей × сайты")
+    parser.add_argument("--from", dest="date_from", required=True, help="Первая дата вылета, ДД.ММ.ГГГГ")
+    parser.add_argument("--to", dest="date_to", required=True, help="Последняя дата вылета, ДД.ММ.ГГГГ")
+    parser.add_argument("--nights", nargs="+", default=["3-5", "6-8", "9-11"])
+    parser.add_argument("--sites", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--base", help="JSON с остальными параметрами поиска (город, страна, туристы, операторы)")
+    parser.add_argument("--browsers", type=int, default=None, help="Общий лимит браузеров")
+    parser.add_argument("--checkpoint", default="matrix_checkpoint.jsonl", help="Файл частичных результатов")
+    parser.add_argument("--out", default=None, help="Куда сохранить матрицу (JSON)")
+    parser.add_argument("--lean", action="store_true")
+    args = parser.parse_args()
+
+    base_data = default_test_data
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            base_data = json.load(f)
+    result_matrix = run_matrix(
+        date_range(args.date_from, args.date_to), args.nights, args.sites, base_data,
+        args.browsers, args.checkpoint, lean=args.lean,
+    )
+    print_matrix(result_matrix)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result_matrix, f, ensure_ascii=False)
+        print(f"\n💾 Матрица сохранена в {args.out}")
+    sys.exit(0 if not result_matrix["missing"] else 1)
@@ -0,0 +1,148 @@
+import json
+import math
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120)
+
+
+class Tracer:
+    def __init__(self):
+        self.started = time.time()
+        self.spans = []
+
+    @contextmanager
+    def span(self, name):
+        start = time.time()
+        record = {"name": name, "start": round(start - self.started, 3), "seconds": 0.0, "ok": True}
+        self.spans.append(record)
+        try:
+            yield record
+        except BaseException as e:
+            record["ok"] = False
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["seconds"] = round(time.time() - start, 3)
+
+    def export(self):
+        return [dict(s) for s in self.spans]
+
+
+def traced(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def observe(self, site, spans):
+        with self._lock:
+            for span in spans:
+                key = (site, span["name"])
+                hist = self._histograms.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+                index = bisect.bisect_left(self.buckets, span["seconds"])
+                if index < len(self.buckets):
+                    hist["counts"][index] += 1
+                hist["sum"] += span["seconds"]
+                hist["count"] += 1
+                if not span.get("ok", True):
+                    self._errors[key] = self._errors.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                f"{site}.{step}": {"count": h["count"], "sum": round(h["sum"], 3), "mean": round(h["sum"] / h["count"], 3)}
+                for (site, step), h in sorted(self._histograms.items())
+            }
+
+    def to_prometheus(self, prefix="search_step"):
+        lines = [
+            f"# HELP {prefix}_seconds Длительность шага поиска",
+            f"# TYPE {prefix}_seconds histogram",
+        ]
+        with self._lock:
+            for (site, step), hist in sorted(self._histograms.items()):
+                labels = f'site="{site}",step="{step}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, hist["counts"]):
+                    cumulative += count
+                    lines.append(f'{prefix}_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_seconds_bucket{{{labels},le="+Inf"}} {hist["count"]}')
+                lines.append(f"{prefix}_seconds_sum{{{labels}}} {hist['sum']:.3f}")
+                lines.append(f"{prefix}_seconds_count{{{labels}}} {hist['count']}")
+            lines.append(f"# HELP {prefix}_errors_total Число шагов, завершившихся ошибкой")
+            lines.append(f"# TYPE {prefix}_errors_total counter")
+            for (site, step), count in sorted(self._errors.items()):
+                lines.append(f'{prefix}_errors_total{{site="{site}",step="{step}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+
+
+class CallCounter:
+    def __init__(self):
+        self.total = 0
+        self.by_command = {}
+
+    def add(self, command):
+        self.total += 1
+        self.by_command[command] = self.by_command.get(command, 0) + 1
+
+    def reset(self):
+        self.total = 0
+        self.by_command = {}
+
+
+def count_webdriver_calls(driver, counter=None):
+    # Все команды драйвера и WebElement проходят через driver.execute — один HTTP-запрос на вызов
+    if getattr(driver, "call_counter", None):
+        return driver.call_counter
+    counter = counter or CallCounter()
+    execute = driver.execute
+
+    def counted(command, params=None):
+        counter.add(command)
+        return execute(command, params)
+
+    driver.execute = counted
+    driver.call_counter = counter
+    return counter
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def write_spans_jsonl(stream, site, spans, **labels):
+    for span in spans:
+        stream.write(json.dumps({"site": site, **labels, **span}, ensure_ascii=False) + "\n")
+    stream.flush()
+
+
+METRICS = MetricsRegistry()
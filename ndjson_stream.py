@@ -0,0 +1,154 @@
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime, timezone
+from batch import SITES, run_batch, load_scenarios
+from catalog import Catalog
+from comparison import OperatorNormalizer
+from history import HistoryStore, iso_date
+
+
+SCHEMA_VERSION = 1
+
+
+def failure_reason(result):
+    if result["success"]:
+        return None
+    if result.get("reason"):
+        return result["reason"]
+    error = result.get("error") or ""
+    if error:
+        return "timeout" if error.startswith("TimeoutException") else "error"
+    if (result.get("completion") or {}).get("reason") == "timeout":
+        return "results_timeout"
+    return "no_results"
+
+
+def phase_timings(spans):
+    timings = {}
+    for span in spans or []:
+        timings[span["name"]] = timings.get(span["name"], 0) + round(span["seconds"] * 1000)
+    return timings
+
+
+def _tourists(value):
+    match = re.match(r"\s*(\d+)", str(value))
+    return int(match.group(1)) if match else None
+
+
+def _nights(value):
+    try:
+        low, high = (int(part) for part in str(value).split("-"))
+        return [low, high]
+    except ValueError:
+        return None
+
+
+def to_record(index, site, scenario, result, normalizer, catalog=None):
+    operators = []
+    for op in result.get("operators") or []:
+        # Строка «12 345 ₽» не нужна потребителю: цена — целое число, валюта — ISO-код
+        if op.get("amount") is None:
+            continue
+        entry = catalog.find(site, "operators", op["name"]) if catalog else None
+        operators.append({
+            "operator_id": normalizer.canonical(op["name"]),
+            "site_operator_id": entry["id"] if entry else None,
+            "name": op["name"],
+            "price": int(op["amount"]),
+            "currency": op.get("currency") or "RUB",
+        })
+    operators.sort(key=lambda op: op["price"])
+    dates = list(scenario.get("departure_dates") or [])
+    return {
+        "v": SCHEMA_VERSION,
+        "scenario": index,
+        "scenario_id": scenario.get("id"),
+        "site": site,
+        "departure_city": scenario.get("departure_city"),
+        "destination_country": scenario.get("destination_country"),
+        "date_from": iso_date(dates[0]) if dates else None,
+        "date_to": iso_date(dates[-1]) if dates else None,
+        "nights": _nights(scenario.get("nights")),
+        "tourists": _tourists(scenario.get("tourists", "")),
+        "success": bool(result["success"]),
+        "reason": failure_reason(result),
+        "error": result.get("error"),
+        "duration_ms": round(result.get("duration", 0.0) * 1000),
+        "timings_ms": phase_timings(result.get("spans")),
+        "completion": (result.get("completion") or {}).get("reason"),
+        "min_price": operators[0]["price"] if operators else None,
+        "currency": operators[0]["currency"] if operators else None,
+        "operators": operators,
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+class RecordWriter:
+    def __init__(self, stream, normalizer=None, catalog=None):
+        self.stream = stream
+        self.normalizer = normalizer or OperatorNormalizer()
+        self.catalog = catalog
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def write(self, index, site, scenario, result):
+        line = json.dumps(to_record(index, site, scenario, result, self.normalizer, self.catalog), ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            # Загрузчик на другом конце пайпа получает запись сразу, а не по заполнении буфера
+            self.stream.flush()
+            self.written += 1
+
+
+def stream_batch(scenarios, stream, site_limits=None, max_browsers=None, history=None, catalog=None, sites=None):
+    scenarios = load_scenarios(scenarios)
+    if sites:
+        scenarios = [dict(s, sites=[site for site in s.get("sites", sites) if site in sites]) for s in scenarios]
+    writer = RecordWriter(stream, catalog=catalog)
+    run_batch(
+        scenarios, site_limits, max_browsers, history=history, catalog=catalog,
+        on_result=lambda index, site, result: writer.write(index, site, scenarios[index], result),
+    )
+    return writer.written
+
+
+def _detach_stdout():
+    # Поиски и chromedriver печатают в stdout, в том числе из дочерних процессов. Переносим fd 1 на stderr,
+    # а записи пишем в копию исходного stdout — в пайпе остаётся только NDJSON
+    sys.stdout.flush()
+    records = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сценарии из JSONL или stdin, результаты — NDJSON в stdout, по записи на сайт и сценарий")
+    parser.add_argument("scenarios", nargs="?", default="-", help="JSONL или JSON-массив со сценариями (по умолчанию — stdin)")
+    parser.add_argument("--sites", nargs="+", choices=list(SITES), default=None, help="Ограничить сайты для всех сценариев")
+    parser.add_argument("--browsers", type=int, default=None, help="Общий лимит браузеров")
+    parser.add_argument("--tourvisor", type=int, default=None, help="Лимит параллельных поисков Tourvisor")
+    parser.add_argument("--sletat", type=int, default=None, help="Лимит параллельных поисков Sletat")
+    parser.add_argument("--history", default=None, help="SQLite-файл для истории цен")
+    parser.add_argument("--catalog", default=None, help="JSON справочников: проверка сценариев и ID операторов сайта")
+    args = parser.parse_args()
+
+    output = _detach_stdout()
+    limits = {site: getattr(args, site) for site in SITES if getattr(args, site)}
+    store = HistoryStore(args.history) if args.history else None
+    try:
+        count = stream_batch(
+            args.scenarios, output, limits, args.browsers, history=store,
+            catalog=Catalog(args.catalog) if args.catalog else None, sites=args.sites,
+        )
+        print(f"✅ Записей: {count}", file=sys.stderr)
+    except BrokenPipeError:
+        # Потребитель закрыл пайп (например, head) — это не ошибка поиска
+        os.dup2(os.open(os.devnull, os.O_WRONLY), output.fileno())
+        sys.exit(0)
+    finally:
+        if store:
+            store.close()
@@ -0,0 +1,181 @@
+import re
+import json
+import time
+import base64
+from selenium.common.exceptions import WebDriverException
+from extract import currency_code
+
+
+NAME_KEYS = ("operatorname", "operatorName", "OperatorName", "operator_name", "tourOperatorName")
+PRICE_KEYS = ("price", "Price", "minprice", "minPrice", "MinPrice", "min_price")
+CURRENCY_KEYS = ("currency", "Currency", "currencyName", "CurrencyName")
+CURRENCY_SYMBOLS = {"RUB": "₽", "USD": "$", "EUR": "€", "KZT": "₸"}
+
+
+class CaptureRule:
+    def __init__(self, url_pattern, name_keys=NAME_KEYS, price_keys=PRICE_KEYS):
+        self.url_pattern = re.compile(url_pattern)
+        self.name_keys = name_keys
+        self.price_keys = price_keys
+
+    def matches(self, url):
+        return bool(self.url_pattern.search(url))
+
+    def parse(self, payload):
+        prices = {}
+        flags = []
+        self._walk(payload, prices, flags)
+        return prices, bool(flags) and all(flags)
+
+    def _walk(self, node, prices, flags):
+        if isinstance(node, list):
+            processed = [n.get("IsProcessed") for n in node if isinstance(n, dict) and "IsProcessed" in n]
+            if processed:
+                flags.append(all(processed))
+            for child in node:
+                self._walk(child, prices, flags)
+            return
+        if not isinstance(node, dict):
+            return
+        self._read_status(node, flags)
+        name = next((node[k] for k in self.name_keys if isinstance(node.get(k), str) and node[k].strip()), None)
+        price = next((node[k] for k in self.price_keys if node.get(k) not in (None, "", 0)), None)
+        if name and price is not None:
+            amount = _to_int(price)
+            if amount:
+                currency = next((str(node[k]) for k in CURRENCY_KEYS if node.get(k)), "")
+                key = name.strip()
+                if key not in prices or amount < prices[key][0]:
+                    prices[key] = (amount, currency_code(currency))
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                self._walk(value, prices, flags)
+
+    def _read_status(self, node, flags):
+        state = node.get("state")
+        if isinstance(state, str):
+            flags.append(state.lower() in ("finished", "complete", "completed", "done"))
+        for key in ("IsFinished", "isFinished", "finished", "IsLoaded"):
+            if isinstance(node.get(key), bool):
+                flags.append(node[key])
+        progress = node.get("progress")
+        if isinstance(progress, (int, float)) and not isinstance(progress, bool) and "state" not in node:
+            flags.append(progress >= 100)
+
+
+CAPTURE_HOSTS = {"tourvisor": r"tourvisor\.ru", "sletat": r"sletat\.ru"}
+CAPTURE_PATTERNS = {
+    "tourvisor": r"{host}/.*(result|search)[^/?]*\.php|/api/.*tours?/(result|status)",
+    "sletat": r"{host}/.*(GetLoadState|GetTours|search/(state|result))",
+}
+CAPTURE_NAME_KEYS = {"tourvisor": NAME_KEYS, "sletat": NAME_KEYS + ("SourceName", "Name")}
+
+
+def capture_rule(site, hosts=()):
+    # Кроме домена сайта — любые хосты, например адрес ReplayServer с репликой страницы
+    host = "(?:" + "|".join([CAPTURE_HOSTS[site]] + [re.escape(h) for h in hosts if h]) + ")"
+    return CaptureRule(CAPTURE_PATTERNS[site].format(host=host), CAPTURE_NAME_KEYS[site])
+
+
+CAPTURE_RULES = {site: capture_rule(site) for site in CAPTURE_PATTERNS}
+
+
+class NetworkCapture:
+    def __init__(self, driver, rule):
+        self.driver = driver
+        self.rule = rule
+        self.enabled = False
+        self.finished = False
+        self.prices = {}
+        self.responses = []
+        self._pending = {}
+
+    def start(self):
+        try:
+            self.driver.get_log("performance")
+            self.enabled = True
+        except WebDriverException as e:
+            print(f"⚠️ Перехват сети недоступен (нужен goog:loggingPrefs performance): {e}")
+            self.enabled = False
+        return self.enabled
+
+    def reset(self):
+        self.finished = False
+        self.prices = {}
+        self.responses = []
+        self._pending = {}
+        if self.enabled:
+            self.driver.get_log("performance")
+
+    def poll(self):
+        if not self.enabled:
+            return False
+        for entry in self.driver.get_log("performance"):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            method, params = message.get("method"), message.get("params", {})
+            if method == "Network.responseReceived":
+                url = params.get("response", {}).get("url", "")
+                if self.rule.matches(url):
+                    self._pending[params["requestId"]] = url
+            elif method == "Network.loadingFinished" and params.get("requestId") in self._pending:
+                self._consume(params["requestId"], self._pending.pop(params["requestId"]))
+        return self.finished
+
+    def wait(self, timeout=120, interval=0.25):
+        if not self.enabled:
+            return None
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.poll():
+                return self.operators()
+            time.sleep(interval)
+        return self.operators() if self.prices else None
+
+    def operators(self):
+        ops = []
+        for name, (amount, currency) in sorted(self.prices.items(), key=lambda kv: kv[1][0]):
+            ops.append({
+                "name": name,
+                "price": f"{amount} {CURRENCY_SYMBOLS.get(currency, currency)}",
+                "amount": amount,
+                "currency": currency,
+            })
+        return ops
+
+    def dump(self, path):
+        recording = {}
+        for url, payload in self.responses:
+            recording.setdefault(re.sub(r"^https?://[^/]+", "", url).split("?")[0], []).append(payload)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(recording, f, ensure_ascii=False, indent=2)
+
+    def _consume(self, request_id, url):
+        try:
+            body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except WebDriverException:
+            return
+        text = body.get("body", "")
+        if body.get("base64Encoded"):
+            text = base64.b64decode(text).decode("utf-8", "replace")
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return
+        self.responses.append((url, payload))
+        prices, finished = self.rule.parse(payload)
+        for name, (amount, currency) in prices.items():
+            if name not in self.prices or amount < self.prices[name][0]:
+                self.prices[name] = (amount, currency)
+        self.finished = self.finished or finished
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = re.sub(r"\D", "", str(value).split(".")[0].split(",")[0])
+    return int(digits) if digits else None
@@ -0,0 +1,100 @@
+import time
+from selenium.common.exceptions import (
+    StaleElementReferenceException, TimeoutException, ElementClickInterceptedException,
+    ElementNotInteractableException, NoSuchElementException, JavascriptException, WebDriverException,
+)
+
+
+RECOVERABLE = (
+    StaleElementReferenceException, TimeoutException, ElementClickInterceptedException,
+    ElementNotInteractableException, NoSuchElementException, JavascriptException,
+)
+
+ESCALATION = {"page": 2, "browser": 1}
+
+# Клик вне формы закрывает открытый выпадающий список, оставшийся от упавшей попытки
+DISMISS_JS = "if (document.activeElement) document.activeElement.blur(); document.body.click();"
+
+
+class RetryPolicy:
+    def __init__(self, attempts=3, delay=0.3, recoverable=RECOVERABLE):
+        self.attempts = attempts
+        self.delay = delay
+        self.recoverable = recoverable
+
+    def should_retry(self, error, attempt):
+        return attempt < self.attempts and isinstance(error, self.recoverable)
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+POLICIES = {
+    "open": RetryPolicy(attempts=2, delay=1.0, recoverable=(TimeoutException, WebDriverException)),
+    "search": RetryPolicy(attempts=2),
+}
+
+
+class StepPipeline:
+    def __init__(self, steps, escalation=None, policies=None, restart_browser=None, before_retry=None, stop=None):
+        self.steps = list(steps)
+        self.escalation = dict(ESCALATION, **(escalation or {}))
+        self.policies = dict(POLICIES, **(policies or {}))
+        self.restart_browser = restart_browser
+        self.before_retry = before_retry
+        self.stop = stop or (lambda: False)
+        self.completed = []
+        self.log = []
+
+    def _record(self, step, attempt, action, error):
+        self.log.append({"step": step, "attempt": attempt, "action": action, "error": f"{type(error).__name__}: {error}".strip()[:200]})
+
+    def run(self):
+        page_left = self.escalation["page"]
+        browser_left = self.escalation["browser"] if self.restart_browser else 0
+        index, attempt = 0, 0
+        while index < len(self.steps):
+            name, step = self.steps[index]
+            try:
+                step()
+            except Exception as e:
+                if self.stop():
+                    raise
+                attempt += 1
+                policy = self.policies.get(name, DEFAULT_POLICY)
+                if policy.should_retry(e, attempt):
+                    # Тот же шаг на той же странице: уже заполненные поля не трогаем
+                    self._record(name, attempt, "retry", e)
+                    print(f"🔄 Повтор шага {name} ({attempt}/{policy.attempts - 1}): {type(e).__name__}")
+                    self._dismiss()
+                    time.sleep(policy.delay)
+                    continue
+                if page_left > 0:
+                    page_left -= 1
+                    self._record(name, attempt, "reload", e)
+                    print(f"🔄 Шаг {name} не удался — открываем страницу заново")
+                elif browser_left > 0:
+                    browser_left -= 1
+                    self._record(name, attempt, "restart", e)
+                    print(f"🔄 Шаг {name} не удался — перезапускаем браузер")
+                    self.restart_browser()
+                else:
+                    self._record(name, attempt, "failed", e)
+                    raise
+                # После перезагрузки форма пустая — проходим цепочку с начала
+                self.completed = []
+                index, attempt = 0, 0
+                continue
+            self.completed.append(name)
+            index, attempt = index + 1, 0
+        return self.completed
+
+    def _dismiss(self):
+        if not self.before_retry:
+            return
+        try:
+            self.before_retry()
+        except Exception:
+            pass
+
+    def report(self):
+        return {"completed": list(self.completed), "recoveries": list(self.log)}
@@ -0,0 +1,100 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+
+def load_recording(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ReplayServer:
+    def __init__(self, routes=None, latency=0.0, host="127.0.0.1", port=0):
+        self.routes = {}
+        self.latency = latency
+        self.hits = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+        for path, responses in (routes or {}).items():
+            self.add(path, responses)
+
+    def add(self, path, responses):
+        # Ответы отдаются по очереди на повторные опросы, последний повторяется
+        if not isinstance(responses, list) or not responses:
+            raise ValueError(f"Для {path} нужен непустой список ответов")
+        with self._lock:
+            self.routes[path] = list(responses)
+            self.hits[path] = 0
+
+    def url(self, path="/"):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ReplayServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next(self, path):
+        with self._lock:
+            responses = self.routes.get(path)
+            if responses is None:
+                return None
+            index = min(self.hits[path], len(responses) - 1)
+            self.hits[path] += 1
+            return responses[index]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._reply()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                self._reply()
+
+            def _reply(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server._next(urlsplit(self.path).path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                if isinstance(body, (dict, list)):
+                    payload, content_type = json.dumps(body, ensure_ascii=False).encode(), "application/json; charset=utf-8"
+                elif isinstance(body, bytes):
+                    payload, content_type = body, "application/octet-stream"
+                elif body.lstrip().startswith("<"):
+                    payload, content_type = body.encode(), "text/html; charset=utf-8"
+                else:
+                    payload, content_type = body.encode(), "application/javascript; charset=utf-8"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
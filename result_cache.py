@@ -0,0 +1,180 @@
+import re
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+CITY_ALIASES = {
+    "санкт-петербург": "с.петербург",
+    "спб": "с.петербург",
+    "питер": "с.петербург",
+    "мск": "москва",
+}
+
+
+def normalize_city(city):
+    key = re.sub(r"\s+", " ", str(city)).strip().lower()
+    return CITY_ALIASES.get(key, key)
+
+
+def normalize_tourists(tourists):
+    if isinstance(tourists, int):
+        return tourists
+    match = re.search(r"\d+", str(tourists))
+    return int(match.group()) if match else 1
+
+
+def normalize_params(test_data):
+    return {
+        "departure_city": normalize_city(test_data["departure_city"]),
+        "destination_country": str(test_data["destination_country"]).strip().lower(),
+        "departure_dates": [str(d).strip() for d in test_data["departure_dates"]],
+        "nights": str(test_data["nights"]).replace(" ", ""),
+        "tourists": normalize_tourists(test_data["tourists"]),
+        "operators": sorted(k for k, v in (test_data.get("operators") or {}).items() if v),
+        "charter": int(bool(test_data.get("charter", 0))),
+        "direct": int(bool(test_data.get("direct", 0))),
+    }
+
+
+def cache_key(site, test_data):
+    raw = json.dumps([site, normalize_params(test_data)], ensure_ascii=False, sort_keys=True)
+    return f"{site}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+class MemoryBackend:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def set(self, key, stored_at, result):
+        with self._lock:
+            self._items[key] = (stored_at, result)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class SqliteBackend:
+    def __init__(self, path, max_size=10000):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            "key TEXT PRIMARY KEY, stored_at REAL NOT NULL, accessed_at REAL NOT NULL, result TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS result_cache_accessed ON result_cache (accessed_at)")
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT stored_at, result FROM result_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE result_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0], json.loads(row[1])
+
+    def set(self, key, stored_at, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, stored_at, accessed_at, result) VALUES (?, ?, ?, ?)",
+                (key, stored_at, time.time(), json.dumps(result, ensure_ascii=False)),
+            )
+            self._conn.execute(
+                "DELETE FROM result_cache WHERE key IN ("
+                "SELECT key FROM result_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM result_cache")
+
+    def close(self):
+        self._conn.close()
+
+
+class ResultCache:
+    def __init__(self, ttl=300, stale_for=120, max_size=256, path=None, backend=None):
+        self.ttl = ttl if isinstance(ttl, dict) else {}
+        self.default_ttl = ttl if not isinstance(ttl, dict) else 300
+        self.stale_for = stale_for
+        if backend is None:
+            backend = SqliteBackend(path, max_size) if path else MemoryBackend(max_size)
+        self.backend = backend
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def ttl_for(self, site):
+        return self.ttl.get(site, self.default_ttl)
+
+    def get_or_run(self, site, test_data, runner):
+        key = cache_key(site, test_data)
+        item = self.backend.get(key)
+        if item is not None:
+            stored_at, result = item
+            age = time.time() - stored_at
+            if age < self.ttl_for(site):
+                return self._tagged(result, "hit", age)
+            if age < self.ttl_for(site) + self.stale_for:
+                self._refresh_async(key, runner)
+                return self._tagged(result, "stale", age)
+        return self._tagged(self._run_and_store(key, runner), "miss", 0.0)
+
+    def invalidate(self, site, test_data):
+        self.backend.delete(cache_key(site, test_data))
+
+    def _run_and_store(self, key, runner):
+        result = runner()
+        # Провалы не кэшируем: это чаще сбой браузера, чем реальное отсутствие туров
+        if result and result.get("success"):
+            self.backend.set(key, time.time(), copy.deepcopy(result))
+        return result
+
+    def _refresh_async(self, key, runner):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._run_and_store(key, runner)
+            except Exception as e:
+                print(f"⚠️ Не удалось обновить кэш {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"CacheRefresh-{key[:16]}", daemon=True).start()
+
+    def _tagged(self, result, state, age):
+        result = copy.deepcopy(result)
+        result["cache"] = {"state": state, "age": round(age, 1)}
+        return result
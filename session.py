@@ -0,0 +1,147 @@
+import time
+from main import TourvisorSearchTest, SletatSearchTest, prepare_tourvisor_data, prepare_sletat_data
+from metrics import Tracer
+from streaming import OperatorStream
+from pipeline import StepPipeline
+
+
+def _selected(operators):
+    return frozenset(key for key, flag in (operators or {}).items() if flag)
+
+
+# Значения полей для сравнения с текущим состоянием формы; сами шаги — в FORM_STEPS классов поиска
+FORM_VALUES = {
+    "departure_city": lambda d: d["departure_city"],
+    "destination_country": lambda d: d["destination_country"],
+    "departure_dates": lambda d: tuple(d["departure_dates"]),
+    "nights": lambda d: d["nights"],
+    "tourists": lambda d: d["tourists"],
+    "operators": lambda d: _selected(d.get("operators")),
+    "charter": lambda d: d.get("charter", 1),
+}
+
+SITE_VALUES = {
+    "sletat": {"charter": lambda d: (bool(d.get("charter")), bool(d.get("direct")))},
+}
+
+# Смена города вылета пересобирает список стран, поэтому страну выбираем заново
+DEPENDENT = {"departure_city": ["destination_country"]}
+
+PAGES = {
+    "tourvisor": {"cls": TourvisorSearchTest, "prepare": prepare_tourvisor_data, "collect": "verify_search_results"},
+    "sletat": {"cls": SletatSearchTest, "prepare": prepare_sletat_data, "collect": "_wait_for_results"},
+}
+
+
+def _irreversible(site, field, old, new):
+    # Шаги выбора операторов (и флагов Sletat) умеют только ставить галочки —
+    # снять прежний выбор можно лишь заново открыв страницу
+    if field == "operators":
+        return bool(old - new)
+    if site == "sletat" and field == "charter":
+        return any(was and not now for was, now in zip(old, new))
+    return False
+
+
+class SearchSession:
+    def __init__(self, site, pool=None, capture=False, lean=False, inject=False, policies=None):
+        if site not in PAGES:
+            raise ValueError(f"Неизвестный сайт: {site}")
+        self.site = site
+        self.page = PAGES[site]
+        self.search = self.page["cls"](pool, capture, lean, inject=inject, policies=policies)
+        self.state = None
+        self.searches = 0
+        self.reused = 0
+
+    def _snapshot(self, data):
+        values = dict(FORM_VALUES, **SITE_VALUES.get(self.site, {}))
+        return {field: values[field](data) for field, _, _ in self.search.FORM_STEPS}
+
+    def plan(self, data):
+        if self.state is None:
+            return None
+        target = self._snapshot(data)
+        changed = [field for field, value in target.items() if self.state[field] != value]
+        if any(_irreversible(self.site, f, self.state[f], target[f]) for f in changed):
+            return None
+        for field in list(changed):
+            changed.extend(dep for dep in DEPENDENT.get(field, []) if dep not in changed)
+        return changed
+
+    def _refill(self, data, changed):
+        # Только повторы на той же странице: перезагрузка сбросила бы поля, которые мы не трогаем
+        search = self.search
+        steps = search._fill_steps(data, changed)
+        search.pipeline = StepPipeline(
+            steps + [("search", search._submit_search)], {"page": 0, "browser": 0}, search.policies,
+            before_retry=search._dismiss_popups, stop=lambda: search.aborted,
+        )
+        search.pipeline.run()
+
+    def run(self, test_data, on_update=None):
+        data = self.page["prepare"](test_data)
+        search = self.search
+        search.tracer = Tracer()
+        search.stream = OperatorStream(on_update, self.site) if on_update else None
+        search.test_data = data
+        search.completion_info = None
+        search.stale = None
+        search.error = None
+        search.pipeline = None
+        search.form_fill = None
+        search.injected = set()
+        print(f"\n🔁 ПОИСК В СЕССИИ {self.site.upper()} #{self.searches + 1}\n" + "=" * 40)
+        outcome = [] if self.site == "sletat" else False
+        changed = None
+        search_start = None
+        try:
+            changed = self.plan(data) if search.driver else None
+            if changed is not None:
+                print(f"✏️ Меняем только: {', '.join(changed) or 'ничего'}")
+                try:
+                    self._refill(data, changed)
+                    self.reused += 1
+                except Exception as e:
+                    if search.aborted:
+                        raise
+                    print(f"⚠️ Не удалось обновить форму ({type(e).__name__}) — заполняем заново")
+                    changed = None
+            if changed is None:
+                self.state = None
+                if search.driver is None:
+                    search.setup()
+                search._run_pipeline(data)
+            self.state = self._snapshot(data)
+            search_start = time.time()
+            outcome = getattr(search, self.page["collect"])()
+        except Exception as e:
+            print(f"\n💥 Ошибка в сессии {self.site}: {e}")
+            search.error = f"{type(e).__name__}: {e}"
+            # Состояние формы неизвестно — следующий поиск начнём с чистой страницы
+            self.state = None
+        finally:
+            duration = time.time() - (search_start or time.time())
+            self.searches += 1
+            result = search.build_result(outcome, duration)
+        result["form"] = {"reused": changed is not None, "changed": changed if changed is not None else [f[0] for f in search.FORM_STEPS]}
+        return result
+
+    def sweep(self, scenarios, on_update=None):
+        for scenario in scenarios:
+            yield scenario, self.run(scenario, on_update)
+
+    def abort(self):
+        self.state = None
+        self.search.abort()
+
+    def close(self):
+        self.state = None
+        if self.search.driver:
+            self.search.teardown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
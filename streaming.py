@@ -0,0 +1,66 @@
+import time
+import queue
+import threading
+
+
+class OperatorStream:
+    def __init__(self, callback, site=None):
+        self.callback = callback
+        self.site = site
+        self.started = time.time()
+        self.current = {}
+        self.updates = 0
+        self.completed = False
+
+    def push(self, ops):
+        fresh = {op["name"]: op for op in ops}
+        added = [op for name, op in fresh.items() if name not in self.current]
+        changed = [op for name, op in fresh.items() if name in self.current and self.current[name]["amount"] != op["amount"]]
+        removed = [name for name in self.current if name not in fresh]
+        if not (added or changed or removed):
+            return False
+        self.current = fresh
+        self.updates += 1
+        self._emit({"type": "update", "added": added, "changed": changed, "removed": removed, "total": len(fresh)})
+        return True
+
+    def complete(self, ops, success):
+        if self.completed:
+            return
+        self.completed = True
+        if ops:
+            self.push(ops)
+        self._emit({"type": "complete", "success": success, "operators": list(ops), "updates": self.updates})
+
+    def _emit(self, event):
+        event["site"] = self.site
+        event["elapsed"] = round(time.time() - self.started, 3)
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f"⚠️ Ошибка в обработчике обновлений: {e}")
+
+
+def stream_search(site, test_data, pool=None, capture=False, lean=False):
+    # main сам импортирует OperatorStream, поэтому классы поиска берём при вызове
+    from async_api import SITES
+    cls, prepare = SITES[site]
+    events = queue.Queue()
+    search = cls(pool, capture, lean)
+    worker = threading.Thread(
+        target=search.run_test, args=(prepare(test_data),), kwargs={"on_update": events.put},
+        name=f"Stream-{site}", daemon=True,
+    )
+    worker.start()
+    finished = False
+    try:
+        while True:
+            event = events.get()
+            yield event
+            if event["type"] == "complete":
+                finished = True
+                return
+    finally:
+        if not finished:
+            # Потребитель перестал читать поток — браузер больше не нужен
+            search.abort()
@@ -0,0 +1,298 @@
+import copy
+import time
+import uuid
+import threading
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException, JavascriptException, TimeoutException
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.switch_to import SwitchTo
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+from driver_pool import build_chrome_options, available_memory_mb
+from lean import block_resources
+
+
+TAB_MEMORY_MB = 250
+BROWSER_SITE = "sletat"  # аргументы Sletat — надмножество аргументов Tourvisor
+
+# Фоновые вкладки Chrome иначе душит таймерами, и выдача в них грузится в разы медленнее
+TAB_ARGUMENTS = [
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+]
+
+ASYNC_POLL = 0.05
+
+# Обёртка асинхронного скрипта: тот же контракт (колбэк последним аргументом), но результат остаётся в странице
+_ASYNC_START_JS = ("""
+const token = arguments[0], args = arguments[1];
+const store = window.__tabAsync = window.__tabAsync || {};
+store[token] = null;
+const done = value => { store[token] = {value: value === undefined ? null : value}; };
+try {
+    (function () {
+""", """
+    }).apply(null, args.concat([done]));
+} catch (e) {
+    store[token] = {error: String(e && e.message || e)};
+}
+""")
+
+_ASYNC_POLL_JS = """
+const store = window.__tabAsync, token = arguments[0];
+if (!store || !(token in store)) return {error: 'страница перезагрузилась до конца скрипта'};
+const result = store[token];
+if (result) delete store[token];
+return result;
+"""
+
+
+def create_tab_browser(lean=False):
+    options = build_chrome_options(BROWSER_SITE, lean=lean)
+    for arg in TAB_ARGUMENTS:
+        options.add_argument(arg)
+    # driver.get держит браузер занятым до загрузки — не ждём картинок и стилей
+    options.page_load_strategy = "eager"
+    driver = webdriver.Chrome(options=options)
+    if not lean:
+        try:
+            driver.maximize_window()
+        except Exception:
+            driver.quit()
+            raise
+    return driver
+
+
+class _Browser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.lock = threading.RLock()
+        # Исходная вкладка остаётся открытой: без неё браузер закроется вместе с последним поиском
+        self.home = driver.current_window_handle
+        self.current = self.home
+        self.tabs = {}
+        self.created = time.time()
+
+    def command(self, handle, driver, command, params=None):
+        with self.lock:
+            if self.current != handle:
+                RemoteWebDriver.execute(driver, Command.SWITCH_TO_WINDOW, {"handle": handle})
+                self.current = handle
+            return RemoteWebDriver.execute(driver, command, params)
+
+    def cdp(self, cmd, params=None):
+        # Команды Target.* общие для браузера, но отправлять их можно только из живого окна
+        return self.command(self.home, self.driver, "executeCdpCommand", {"cmd": cmd, "params": params or {}})["value"]
+
+    def handles(self):
+        return self.command(self.home, self.driver, Command.W3C_GET_WINDOW_HANDLES)["value"]
+
+
+class _Tab:
+    def __init__(self, browser, site, handle, context):
+        self.browser = browser
+        self.site = site
+        self.handle = handle
+        self.context = context
+        self.opened = time.time()
+
+
+class TabPool:
+    def __init__(self, browsers=1, max_tabs=4, per_tab_mb=TAB_MEMORY_MB, reserve_mb=512, lean=False,
+                 isolate=True, factory=None):
+        self.browsers = browsers
+        self.max_tabs = max_tabs
+        self.per_tab_mb = per_tab_mb
+        self.reserve_mb = reserve_mb
+        self.lean = lean
+        # Вкладки не пишут performance-лог — захват сети в них недоступен
+        self.capture = False
+        self.isolate = isolate
+        self.factory = factory or (lambda: create_tab_browser(lean))
+        self._browsers = []
+        self._launching = 0
+        self._views = {}
+        self._lock = threading.Condition()
+        self._closed = False
+
+    def _memory_allows_tab(self):
+        free = available_memory_mb()
+        return free is None or free - self.reserve_mb >= self.per_tab_mb
+
+    def _pick_locked(self):
+        candidates = [b for b in self._browsers if len(b.tabs) < self.max_tabs]
+        if not candidates:
+            return None
+        browser = min(candidates, key=lambda b: len(b.tabs))
+        # Первая вкладка в браузере разрешена всегда, следующие — только при запасе памяти
+        if browser.tabs and not self._memory_allows_tab():
+            return None
+        return browser
+
+    def acquire(self, site, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Пул вкладок закрыт")
+                browser = self._pick_locked()
+                if browser is None and len(self._browsers) + self._launching < self.browsers:
+                    self._launching += 1
+                    break
+                if browser is not None:
+                    # Место под вкладку занимаем сразу, до открытия — иначе соседние потоки превысят лимит
+                    placeholder = object()
+                    browser.tabs[placeholder] = None
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"Нет свободной вкладки для {site}")
+                self._lock.wait(remaining)
+        if browser is None:
+            try:
+                browser = _Browser(self.factory())
+            finally:
+                with self._lock:
+                    self._launching -= 1
+                    self._lock.notify_all()
+            with self._lock:
+                self._browsers.append(browser)
+                placeholder = object()
+                browser.tabs[placeholder] = None
+        try:
+            tab = self._open_tab(browser, site)
+        except Exception:
+            with self._lock:
+                browser.tabs.pop(placeholder, None)
+                self._lock.notify_all()
+            raise
+        view = self._view(tab)
+        with self._lock:
+            browser.tabs.pop(placeholder, None)
+            browser.tabs[tab.handle] = tab
+            self._views[id(view)] = tab
+        if self.lean:
+            block_resources(view, site)
+        view.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        return view
+
+    def _open_tab(self, browser, site):
+        with browser.lock:
+            context = None
+            if self.isolate:
+                try:
+                    # Отдельный browser context — свои cookies, localStorage и кэш, как у окна инкогнито
+                    context = browser.cdp("Target.createBrowserContext", {"disposeOnDetach": True})["browserContextId"]
+                except WebDriverException as e:
+                    print(f"⚠️ Изолированный контекст недоступен, вкладка делит cookies с соседями: {e}")
+            handle = self._create_target(browser, context)
+            if handle is None and context:
+                # Старые chromedriver не видят вкладки чужих контекстов — откатываемся на общий
+                browser.cdp("Target.disposeBrowserContext", {"browserContextId": context})
+                print("⚠️ chromedriver не видит вкладку изолированного контекста, вкладка делит cookies с соседями")
+                context = None
+                handle = self._create_target(browser, None)
+            if handle is None:
+                raise RuntimeError("Новая вкладка не появилась среди window_handles")
+            return _Tab(browser, site, handle, context)
+
+    def _create_target(self, browser, context):
+        params = {"url": "about:blank"}
+        if context:
+            params["browserContextId"] = context
+        before = set(browser.handles())
+        target = browser.cdp("Target.createTarget", params)["targetId"]
+        handles = browser.handles()
+        if target in handles:
+            return target
+        fresh = [h for h in handles if h not in before]
+        if fresh:
+            return fresh[0]
+        browser.cdp("Target.closeTarget", {"targetId": target})
+        return None
+
+    def _view(self, tab):
+        browser = tab.browser
+        view = copy.copy(browser.driver)
+        # Любая команда вкладки, включая команды её элементов, сначала переключает окно WebDriver
+        view.execute = lambda command, params=None: browser.command(tab.handle, view, command, params)
+        view._switch_to = SwitchTo(view)
+        view.quit = lambda: self.release(view, discard=True)
+        # Асинхронный скрипт держал бы замок браузера до своего конца, и соседние вкладки не могли бы даже
+        # опросить выдачу. Поэтому скрипт запускается синхронной командой, а результат забирается короткими опросами.
+        # Таймаут тоже свой у вкладки: общий таймаут сессии соседи сбрасывали бы друг другу
+        view.script_timeout = 30
+        view.set_script_timeout = lambda seconds: setattr(view, "script_timeout", seconds)
+        view.execute_async_script = lambda script, *args: self._execute_async(view, script, args)
+        return view
+
+    def _execute_async(self, view, script, args):
+        token = uuid.uuid4().hex
+        view.execute_script(_ASYNC_START_JS[0] + script + _ASYNC_START_JS[1], token, list(args))
+        deadline = time.time() + view.script_timeout
+        while True:
+            time.sleep(ASYNC_POLL)
+            result = view.execute_script(_ASYNC_POLL_JS, token)
+            if result:
+                if "error" in result:
+                    raise JavascriptException(result["error"])
+                return result["value"]
+            if time.time() > deadline:
+                raise TimeoutException(f"Асинхронный скрипт не уложился в {view.script_timeout} сек")
+
+    def release(self, driver, discard=False):
+        with self._lock:
+            tab = self._views.pop(id(driver), None)
+        if tab is None:
+            return
+        browser = tab.browser
+        try:
+            with browser.lock:
+                browser.cdp("Target.closeTarget", {"targetId": tab.handle})
+                if tab.context:
+                    browser.cdp("Target.disposeBrowserContext", {"browserContextId": tab.context})
+        except WebDriverException as e:
+            print(f"⚠️ Не удалось закрыть вкладку: {e}")
+            discard = True
+        with self._lock:
+            browser.tabs.pop(tab.handle, None)
+            if discard and not browser.tabs and not self._healthy(browser):
+                self._browsers.remove(browser)
+                self._quit(browser)
+            self._lock.notify_all()
+
+    def _healthy(self, browser):
+        try:
+            return browser.command(browser.home, browser.driver, Command.W3C_EXECUTE_SCRIPT, {"script": "return 1;", "args": []})["value"] == 1
+        except Exception:
+            return False
+
+    def _quit(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "browsers": len(self._browsers),
+                "tabs": sum(len(b.tabs) for b in self._browsers),
+                "max_tabs": self.max_tabs,
+                "memory_mb": available_memory_mb(),
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            browsers, self._browsers = self._browsers, []
+            self._views.clear()
+            self._lock.notify_all()
+        for browser in browsers:
+            self._quit(browser)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
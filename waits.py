@@ -0,0 +1,128 @@
+import time
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+
+_SETTLE_JS = """
+const el = arguments[0], scroll = arguments[1], timeoutMs = arguments[2];
+const done = arguments[arguments.length - 1];
+if (scroll) el.scrollIntoView({block: 'center'});
+const start = performance.now();
+let last = null, still = 0;
+(function tick() {
+    const r = el.getBoundingClientRect();
+    const key = [r.x, r.y, r.width, r.height].join(',');
+    if (key === last) {
+        if (++still >= 2) return done(true);
+    } else {
+        still = 0;
+        last = key;
+    }
+    if (performance.now() - start > timeoutMs) return done(false);
+    setTimeout(tick, 16);
+})();
+"""
+
+_DOM_QUIET_JS = """
+const root = arguments[0], quietMs = arguments[1], timeoutMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const target = typeof root === 'string' ? document.querySelector(root) : root;
+if (!target) return done(false);
+let timer = null, limit = null;
+const observer = new MutationObserver(() => {
+    clearTimeout(timer);
+    timer = setTimeout(() => finish(true), quietMs);
+});
+function finish(ok) {
+    observer.disconnect();
+    clearTimeout(timer);
+    clearTimeout(limit);
+    done(ok);
+}
+observer.observe(target, {subtree: true, childList: true, attributes: true, characterData: true});
+timer = setTimeout(() => finish(true), quietMs);
+limit = setTimeout(() => finish(false), timeoutMs);
+"""
+
+
+class Waiter:
+    def __init__(self, driver, step_timeout=5, poll=0.05):
+        self.driver = driver
+        self.step_timeout = step_timeout
+        self.poll = poll
+        self.timings = []
+        self._script_timeout = None
+
+    def until(self, condition, name, timeout=None):
+        timeout = self.step_timeout if timeout is None else timeout
+        start = time.time()
+        try:
+            result = WebDriverWait(self.driver, timeout, poll_frequency=self.poll).until(condition)
+        except TimeoutException:
+            result = None
+        self._record(name, start, bool(result))
+        return result
+
+    def settled(self, element, name, scroll=False, timeout=None):
+        return self._async(_SETTLE_JS, name, element, scroll, timeout)
+
+    def dom_quiet(self, root, name, quiet_ms=150, timeout=None):
+        return self._async(_DOM_QUIET_JS, name, root, quiet_ms, timeout)
+
+    def text_changed(self, target, old_text, name, timeout=None):
+        return self.until(lambda d: _text(d, target) not in (None, old_text), name, timeout)
+
+    def text_contains(self, target, text, name, timeout=None):
+        return self.until(lambda d: text in (_text(d, target) or ""), name, timeout)
+
+    def class_contains(self, element, class_name, name, present=True, timeout=None):
+        def check(d):
+            try:
+                return (class_name in (element.get_attribute("class") or "").split()) == present
+            except WebDriverException:
+                return False
+        return self.until(check, name, timeout)
+
+    def checked(self, element, name, value=True, timeout=None):
+        def check(d):
+            try:
+                return bool(d.execute_script("return arguments[0].checked;", element)) == value
+            except WebDriverException:
+                return False
+        return self.until(check, name, timeout)
+
+    def script_timeout(self, seconds):
+        # Таймаут асинхронных скриптов общий для драйвера — кэшируем, чтобы не слать лишнюю команду.
+        # Вкладка TabPool только запоминает его: драйверу он не уходит, срок скрипта отсчитывает
+        # сама вкладка, опрашивая результат (window.__tabAsync), — кэш верен и для неё
+        if self._script_timeout != seconds:
+            self.driver.set_script_timeout(seconds)
+            self._script_timeout = seconds
+
+    def report(self):
+        return list(self.timings)
+
+    def total(self):
+        return sum(t["seconds"] for t in self.timings)
+
+    def _async(self, script, name, target, arg, timeout):
+        timeout = self.step_timeout if timeout is None else timeout
+        start = time.time()
+        try:
+            self.script_timeout(timeout + 1)
+            ok = bool(self.driver.execute_async_script(script, target, arg, int(timeout * 1000)))
+        except WebDriverException:
+            ok = False
+        self._record(name, start, ok)
+        return ok
+
+    def _record(self, name, start, ok):
+        self.timings.append({"step": name, "seconds": round(time.time() - start, 3), "ok": ok})
+
+
+def _text(driver, target):
+    try:
+        element = driver.find_element(*target) if isinstance(target, tuple) else target
+        return element.text.strip()
+    except WebDriverException:
+        return None